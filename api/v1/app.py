@@ -4,12 +4,31 @@
 
 import os
 from flask import Flask, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from models import storage
+from models.engine import json_codec
 from api.v1.views import app_views
 
 
+class CodecJSONProvider(DefaultJSONProvider):
+    """Encodes and decodes the JSON of the app with the codec of the
+    storage, orjson when it's installed."""
+
+    def dumps(self, obj, **kwargs):
+        """Serializes obj with the codec, compact unless indent is set."""
+        return json_codec.codec.dumps(
+            obj, sort_keys=kwargs.get("sort_keys", self.sort_keys),
+            indent=kwargs.get("indent"),
+            default=kwargs.get("default", self.default))
+
+    def loads(self, s, **kwargs):
+        """Deserializes the JSON text or bytes s with the codec."""
+        return json_codec.codec.loads(s)
+
+
 app = Flask(__name__)
+app.json = CodecJSONProvider(app)
 app.url_map.strict_slashes = False
 app.register_blueprint(app_views)
 
@@ -156,7 +156,8 @@ def update_city(city_id):
         abort(400, "Missing name")
 
     for key, value in data.items():
-        if key in ['id', 'created_at', 'updated_at', 'state_id']:
+        if key in ['id', 'created_at', 'updated_at', 'state_id',
+                   'places']:
             continue
 
         setattr(city_obj, key, value)
@@ -16,13 +16,17 @@ def get_status():
 @app_views.route("/stats")
 def get_stats():
     """Retrieves the number of objects by their type"""
-    return jsonify(
-        {
-            "amenities": storage.count('Amenity'),
-            "cities": storage.count('City'),
-            "places": storage.count('Place'),
-            "reviews": storage.count('Review'),
-            "states": storage.count('State'),
-            "users": storage.count('User')
-        }
-    )
+    counts = storage.counts('Amenity', 'City', 'Place', 'Review', 'State',
+                            'User')
+    stats = {
+        "amenities": counts['Amenity'],
+        "cities": counts['City'],
+        "places": counts['Place'],
+        "reviews": counts['Review'],
+        "states": counts['State'],
+        "users": counts['User']
+    }
+    # hit ratios of storage.get() in database storage mode
+    if hasattr(storage, "cache_stats"):
+        stats["cache"] = storage.cache_stats()
+    return jsonify(stats)
@@ -79,7 +79,8 @@ def update_place(place_id):
         abort(400, "Not a JSON")
 
     for key, value in data.items():
-        if key in ['id', 'created_at', 'updated_at', 'city_id', 'user_id']:
+        if key in ['id', 'created_at', 'updated_at', 'city_id', 'user_id',
+                   'reviews', 'amenities']:
             continue
 
         setattr(place, key, value)
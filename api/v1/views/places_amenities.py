@@ -6,10 +6,9 @@ handles all default RESTFul API actions
 
 from api.v1.views import app_views
 from flask import jsonify, abort
-from models import storage
+from models import storage, storage_t
 from models.place import Place
 from models.amenity import Amenity
-from os import getenv
 
 
 @app_views.route('/places/<place_id>/amenities', methods=['GET'])
@@ -18,7 +17,7 @@ def get_amenities_by_place(place_id):
     place = storage.get(Place, place_id)
     if place is None:
         abort(404)
-    if getenv('HBNB_TYPE_STORAGE') == 'db':
+    if storage_t == 'db':
         return jsonify([amenity.to_dict() for amenity in place.amenities])
 
     # default for FileStorage
@@ -35,14 +34,16 @@ def delete_amenity_by_place(place_id, amenity_id):
     amenity = storage.get(Amenity, amenity_id)
     if amenity is None:
         abort(404)
-    if getenv('HBNB_TYPE_STORAGE') == 'db':
+    if storage_t == 'db':
         if amenity not in place.amenities:
             abort(404)
         place.amenities.remove(amenity)
     else:
         if amenity_id not in place.amenity_ids:
             abort(404)
-        place.amenity_ids.remove(amenity_id)
+        # a new list, so that the place sees the change
+        place.amenity_ids = [linked_id for linked_id in place.amenity_ids
+                             if linked_id != amenity_id]
     storage.save()
     return jsonify({}), 200
 
@@ -56,13 +57,13 @@ def link_amenity_to_place(place_id, amenity_id):
     amenity = storage.get(Amenity, amenity_id)
     if amenity is None:
         abort(404)
-    if getenv('HBNB_TYPE_STORAGE') == 'db':
+    if storage_t == 'db':
         if amenity in place.amenities:
             return jsonify(amenity.to_dict()), 200
         place.amenities.append(amenity)
     else:
         if amenity_id in place.amenity_ids:
             return jsonify(amenity.to_dict()), 200
-        place.amenity_ids.append(amenity_id)
+        place.amenity_ids = place.amenity_ids + [amenity_id]
     storage.save()
     return jsonify(amenity.to_dict()), 201
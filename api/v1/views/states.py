@@ -65,7 +65,7 @@ def handle_state(state_id=None):
             abort(400, "Missing name")
 
         for key, value in data.items():
-            if key in ['id', 'created_at', 'updated_at']:
+            if key in ['id', 'created_at', 'updated_at', 'cities']:
                 continue
 
             setattr(state_obj, key, value)
@@ -120,7 +120,8 @@ def update_user(user_id):
         abort(400, "Not a JSON")
 
     for key, value in data.items():
-        if key in ['id', 'email', 'created_at', 'updated_at']:
+        if key in ['id', 'email', 'created_at', 'updated_at',
+                   'places', 'reviews']:
             continue
 
         setattr(user_obj, key, value)
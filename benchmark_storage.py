@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+"""This script benchmarks FileStorage saves and reloads for each file
+format and JSON codec, the memory-mapped and compact modes and SQLite, on a
+generated data set, as well as the API listing of its users."""
+
+import importlib.util
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# environment of each benchmarked storage mode
+MODES = {
+    "json": {"HBNB_FILE_FORMAT": "json", "HBNB_JSON_CODEC": "json"},
+    "orjson": {"HBNB_FILE_FORMAT": "json", "HBNB_JSON_CODEC": "orjson"},
+    "binary": {"HBNB_FILE_FORMAT": "binary"},
+    "mmap": {"HBNB_FILE_FORMAT": "binary", "HBNB_FILE_MMAP": "1"},
+    "compact": {"HBNB_FILE_FORMAT": "binary", "HBNB_FILE_COMPACT": "1"},
+    "sqlite": {"HBNB_TYPE_STORAGE": "sqlite"},
+}
+
+
+def generate(number_of_objects):
+    """
+    Adds a generated data set to the storage.
+
+    Args:
+        number_of_objects (int): The approximate number of objects, half of
+        them reviews, a quarter places and the rest users, cities and
+        states.
+    """
+    from models import storage
+    from models.city import City
+    from models.place import Place
+    from models.review import Review
+    from models.state import State
+    from models.user import User
+
+    states = [State(name="State {}".format(i))
+              for i in range(max(1, number_of_objects // 100))]
+    cities = [City(name="City {}".format(i),
+                   state_id=states[i % len(states)].id)
+              for i in range(max(1, number_of_objects // 20))]
+    users = [User(email="user{}@hbnb.io".format(i), password="pwd",
+                  first_name="First", last_name="Last")
+             for i in range(max(1, number_of_objects // 20))]
+    places = [Place(name="Place {}".format(i),
+                    city_id=cities[i % len(cities)].id,
+                    user_id=users[i % len(users)].id,
+                    description="A nice place", number_rooms=i % 5,
+                    price_by_night=10 + i % 200, latitude=37.77,
+                    longitude=-122.41)
+              for i in range(max(1, number_of_objects // 4))]
+    reviews = [Review(text="Review {}".format(i),
+                      place_id=places[i % len(places)].id,
+                      user_id=users[i % len(users)].id)
+               for i in range(max(1, number_of_objects // 2))]
+    for obj in states + cities + users + places + reviews:
+        storage.new(obj)
+
+
+def timed(function):
+    """returns the seconds taken by function()"""
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def child_save(number_of_objects):
+    """times the first save of a generated data set, then the save of a
+    single changed object, in the storage file of the working directory"""
+    from models import storage
+    from models.state import State
+
+    generate(number_of_objects)
+    results = {"save_all": timed(storage.save)}
+    state = next(iter(storage.all(State).values()))
+    state.name = "Renamed"
+    results["save_one"] = timed(storage.save)
+    return results
+
+
+def child_reload():
+    """times the cold reload of the storage files of the working directory
+    and measures the peak memory of the process"""
+    from models import storage
+
+    # moved in place only now, as importing models reloads them
+    for name in os.listdir("."):
+        if name.startswith("snapshot."):
+            os.rename(name, "file." + name[len("snapshot."):])
+    results = {"size": sum(os.path.getsize(name) for name in os.listdir(".")
+                           if name.startswith("file.")),
+               "reload": timed(storage.reload)}
+    results["count"] = storage.count()
+    results["rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return results
+
+
+def child_memory():
+    """measures the memory allocated per object by the reload of the
+    storage files of the working directory, indexes included"""
+    from models import storage
+
+    for name in os.listdir("."):
+        if name.startswith("snapshot."):
+            os.rename(name, "file." + name[len("snapshot."):])
+    tracemalloc.start()
+    storage.reload()
+    count = len(storage.all())
+    return {"bytes": tracemalloc.get_traced_memory()[0] / max(count, 1)}
+
+
+def child_api():
+    """measures the requests per second of GET /api/v1/users on the storage
+    files of the working directory"""
+    from models import storage
+
+    for name in os.listdir("."):
+        if name.startswith("snapshot."):
+            os.rename(name, "file." + name[len("snapshot."):])
+    storage.reload()
+    from api.v1.app import app
+    client = app.test_client()
+    client.get("/api/v1/users")
+    requests = 10
+    seconds = timed(lambda: [client.get("/api/v1/users")
+                             for _ in range(requests)])
+    return {"requests": requests / seconds}
+
+
+def run_child(directory, mode, lazy, *args):
+    """runs a step of the benchmark in a new interpreter and returns its
+    results"""
+    env = dict(os.environ, HBNB_FILE_LAZY="1" if lazy else "0",
+               PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH",
+                                                             ""))
+    for name in ("HBNB_ENV", "HBNB_TYPE_STORAGE", "HBNB_FILE_FORMAT",
+                 "HBNB_FILE_MMAP", "HBNB_FILE_COMPACT", "HBNB_JSON_CODEC",
+                 "HBNB_SQLITE_DB"):
+        env.pop(name, None)
+    env.update(MODES[mode])
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child"] +
+        [str(arg) for arg in args],
+        cwd=directory, env=env, check=True, stdout=subprocess.PIPE,
+        universal_newlines=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def run_reload(directory, mode, lazy, step="reload"):
+    """runs the reload, memory or api step on a copy of the files saved in
+    directory"""
+    # the files of FileStorage must be missing when models is imported, so
+    # the child moves them in place; SQLite reads its file on demand
+    prefix = "file." if "HBNB_TYPE_STORAGE" in MODES[mode] else "snapshot."
+    workdir = tempfile.mkdtemp(dir=directory)
+    for name in os.listdir(directory):
+        if name.startswith("file."):
+            shutil.copy(os.path.join(directory, name),
+                        os.path.join(workdir, prefix + name[len("file."):]))
+    return run_child(workdir, mode, lazy, step)
+
+
+def benchmark(number_of_objects):
+    """prints the save and reload figures of each mode"""
+    print("{:>8} {:>12} {:>10} {:>10} {:>10} {:>12} {:>10} {:>11} {:>11} "
+          "{:>8}".format("mode", "size (KiB)", "save all", "save one",
+                         "reload", "lazy reload", "rss (MiB)", "bytes/obj",
+                         "GET users/s", "objects"))
+    for mode in MODES:
+        if MODES[mode].get("HBNB_JSON_CODEC") == "orjson" and \
+                importlib.util.find_spec("orjson") is None:
+            continue
+        with tempfile.TemporaryDirectory() as directory:
+            saved = run_child(directory, mode, False, "save",
+                              number_of_objects)
+            loaded = run_reload(directory, mode, False)
+            lazy = run_reload(directory, mode, True)
+            memory = run_reload(directory, mode, False, "memory")
+            api = run_reload(directory, mode, False, "api")
+        print("{:>8} {:>12.0f} {:>9.3f}s {:>9.3f}s {:>9.3f}s {:>11.3f}s "
+              "{:>10.0f} {:>11.0f} {:>11.1f} {:>8}".format(
+                  mode, loaded["size"] / 1024, saved["save_all"],
+                  saved["save_one"], loaded["reload"], lazy["reload"],
+                  loaded["rss"] / 1024, memory["bytes"], api["requests"],
+                  loaded["count"]))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        step = {"save": lambda arg: child_save(int(arg)),
+                "reload": child_reload,
+                "memory": child_memory,
+                "api": child_api}[sys.argv[2]]
+        print(json.dumps(step(*sys.argv[3:])))
+        sys.exit(0)
+    if len(sys.argv) != 2:
+        print("Usage: {} <number_of_objects>".format(sys.argv[0]))
+        sys.exit(1)
+
+    benchmark(int(sys.argv[1]))
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+"""This script converts a FileStorage file between the JSON and binary
+formats, the format of each file being given by its extension."""
+
+import sys
+from models.engine.file_storage import formats, write_atomic
+
+
+def file_format(path):
+    """
+    Returns the format of a storage file.
+
+    Args:
+        path (str): The path of the file, ending in .bin for the binary
+        format.
+    """
+    if path.endswith(formats["binary"].extension):
+        return formats["binary"]
+    return formats["json"]
+
+
+def convert(source, destination):
+    """
+    Writes the objects of a storage file to another one.
+
+    Args:
+        source (str): The path of the file to read.
+        destination (str): The path of the file to write.
+
+    Returns:
+        int: The number of objects converted.
+    """
+    source_format = file_format(source)
+    destination_format = file_format(destination)
+    items = {}
+    with source_format.open(source) as f:
+        for key, record, value in source_format.records(f):
+            # records appended to a memory-mapped file replace or delete
+            # the earlier ones of their key
+            items.pop(key, None)
+            if record is None:
+                continue
+            if value is None:
+                value = source_format.decode(record)
+            items[key] = destination_format.encode(key, value)
+    write_atomic(destination, destination_format.dump(list(items.items())))
+    return len(items)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: {} <source> <destination>".format(sys.argv[0]))
+        sys.exit(1)
+
+    print("Converted {} objects".format(convert(sys.argv[1], sys.argv[2])))
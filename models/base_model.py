@@ -3,39 +3,239 @@
 Contains class BaseModel
 """
 
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import lru_cache
 import models
+from os import getenv
+import re
 from sqlalchemy import Column, String, DateTime
 from sqlalchemy.ext.declarative import declarative_base
 import uuid
 
 time = "%Y-%m-%dT%H:%M:%S.%f"
 
+# bool - in file storage mode, instances keep their attributes in slots and
+# their dates as microseconds since the epoch (HBNB_FILE_COMPACT)
+compact = models.storage_t != "db" and \
+    getenv("HBNB_FILE_COMPACT", "").lower() in ("1", "true", "yes", "on")
+
+# bool - in file storage mode, the dates of the loaded objects stay
+# strings until read (HBNB_LAZY_DATES)
+lazy_dates = models.storage_t != "db" and \
+    getenv("HBNB_LAZY_DATES", "").lower() in ("1", "true", "yes", "on")
+
+_epoch = datetime(1970, 1, 1)
+_microsecond = timedelta(microseconds=1)
+# the dates written by to_dict(), which datetime.fromisoformat() reads
+_time_pattern = re.compile(
+    r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{6}\Z", re.ASCII)
+
+
+def parse_time(string):
+    """returns the datetime of string, in the format of time"""
+    if _time_pattern.match(string):
+        return datetime.fromisoformat(string)
+    return datetime.strptime(string, time)
+
+
+def format_time(moment):
+    """returns the datetime moment in the format of time, or moment itself
+    if it's a string not parsed yet"""
+    if type(moment) is str:
+        return moment
+    if moment.tzinfo is None and moment.year >= 1000:
+        return moment.isoformat(timespec="microseconds")
+    return moment.strftime(time)
+
+
+def _lazy(string):
+    """returns True if the date string is left to parse on first read"""
+    return lazy_dates and _time_pattern.match(string) is not None
+
+
+@lru_cache(maxsize=None)
+def _read_only(cls):
+    """returns the names of the properties of cls without a setter, e.g.
+    the relationships of file storage mode"""
+    return frozenset(name for base in cls.__mro__
+                     for name, value in vars(base).items()
+                     if type(value) is property and value.fset is None and
+                     name != "__dict__")
+
+
+# value of the _cached slot of an instance while its __init__ runs: its
+# attributes skip the storage hook, since it isn't stored yet
+_initializing = object()
+
+# {tuple: itself} - the orders of assignment of the compact instances,
+# shared by the instances having the same
+_orders = {}
+
+
+def _ordered(order, name, add=True):
+    """returns the shared tuple of order with name added at its end, or
+    removed if not add"""
+    if add:
+        if name in order:
+            return order
+        order += (name,)
+    elif name in order:
+        order = tuple(field for field in order if field != name)
+    else:
+        return order
+    return _orders.setdefault(order, order)
+
+
 if models.storage_t == "db":
     Base = declarative_base()
 else:
     Base = object
 
 
-class BaseModel:
+class CompactModel(type):
+    """type of the models in compact mode: the plain class attributes of a
+    model, e.g. name = "", become slots having them as defaults"""
+
+    def __new__(mcs, name, bases, namespace):
+        defaults = {}
+        fields = ()
+        for base in reversed(bases):
+            defaults.update(getattr(base, "_defaults", {}))
+            fields += tuple(field for field in getattr(base, "_fields", ())
+                            if field not in fields)
+        slots = []
+        for field, value in list(namespace.items()):
+            if field.startswith("_") or not isinstance(
+                    value, (str, int, float, list, type(None))):
+                continue
+            defaults[field] = namespace.pop(field)
+            if field not in fields:
+                slots.append(field)
+        namespace["__slots__"] = tuple(namespace.get("__slots__", ())) + \
+            tuple(slots)
+        namespace["_defaults"] = defaults
+        namespace.setdefault("_fields", fields + tuple(slots))
+        cls = super().__new__(mcs, name, bases, namespace)
+        # the getter of each field for __dict__, raising AttributeError
+        # when the field isn't set
+        cls._getters = {
+            field: getattr(getattr(cls, field), "peek",
+                           getattr(cls, field).__get__)
+            for field in cls._fields}
+        return cls
+
+
+class _CompactDate:
+    """descriptor of a date kept in a slot as microseconds since the epoch,
+    or as the string it was loaded from until read"""
+
+    def __init__(self, slot):
+        """sets the name of the slot"""
+        self.slot = slot
+
+    def __get__(self, obj, cls=None):
+        """returns the date, as a datetime"""
+        if obj is None:
+            return self
+        value = self.peek(obj)
+        if type(value) is str:
+            value = parse_time(value)
+            self.__set__(obj, value)
+        return value
+
+    def peek(self, obj):
+        """returns the date as __dict__ shows it, without parsing it"""
+        value = getattr(obj, self.slot)
+        if type(value) is int:
+            return _epoch + timedelta(microseconds=value)
+        return value
+
+    def __set__(self, obj, value):
+        """sets the date, kept as an integer if value is a naive datetime"""
+        if type(value) is datetime and value.tzinfo is None:
+            value = (value - _epoch) // _microsecond
+        object.__setattr__(obj, self.slot, value)
+
+    def __delete__(self, obj):
+        """unsets the date"""
+        object.__delattr__(obj, self.slot)
+
+
+class _LazyDate:
+    """descriptor of a date kept in the instance dictionary, parsed on
+    first read if it's still a string"""
+
+    def __init__(self, name):
+        """sets the name of the attribute"""
+        self.name = name
+
+    def __get__(self, obj, cls=None):
+        """returns the date, as a datetime"""
+        if obj is None:
+            return self
+        try:
+            value = obj.__dict__[self.name]
+        except KeyError:
+            raise AttributeError(self.name)
+        if type(value) is str:
+            value = parse_time(value)
+            obj.__dict__[self.name] = value
+        return value
+
+    def __set__(self, obj, value):
+        """sets the date"""
+        obj.__dict__[self.name] = value
+
+    def __delete__(self, obj):
+        """unsets the date"""
+        try:
+            del obj.__dict__[self.name]
+        except KeyError:
+            raise AttributeError(self.name)
+
+
+class BaseModel(metaclass=CompactModel if compact else type):
     """The BaseModel class from which future classes will be derived"""
     if models.storage_t == "db":
         id = Column(String(60), primary_key=True)
         created_at = Column(DateTime, default=datetime.utcnow)
         updated_at = Column(DateTime, default=datetime.utcnow)
+    elif compact:
+        # _extra is the dictionary of the attributes that have no slot,
+        # _cached the one returned by to_dict() until the instance changes
+        # and _order the names of the attributes set, in order of assignment
+        __slots__ = ("id", "_created_at", "_updated_at", "_extra", "_cached",
+                     "_order")
+        # tuple - names of the attributes kept in slots
+        _fields = ("id", "created_at", "updated_at")
+        created_at = _CompactDate("_created_at")
+        updated_at = _CompactDate("_updated_at")
+    else:
+        # _cached is the dictionary returned by to_dict() until the
+        # instance changes
+        __slots__ = ("_cached", "__dict__", "__weakref__")
+        if lazy_dates:
+            created_at = _LazyDate("created_at")
+            updated_at = _LazyDate("updated_at")
 
     def __init__(self, *args, **kwargs):
         """Initialization of the base model"""
+        if models.storage_t != "db":
+            object.__setattr__(self, "_cached", _initializing)
         if kwargs:
             for key, value in kwargs.items():
                 if key != "__class__":
                     setattr(self, key, value)
-            if kwargs.get("created_at", None) and type(self.created_at) is str:
-                self.created_at = datetime.strptime(kwargs["created_at"], time)
+            if kwargs.get("created_at", None) and \
+                    type(kwargs["created_at"]) is str:
+                if not _lazy(kwargs["created_at"]):
+                    self.created_at = parse_time(kwargs["created_at"])
             else:
                 self.created_at = datetime.utcnow()
-            if kwargs.get("updated_at", None) and type(self.updated_at) is str:
-                self.updated_at = datetime.strptime(kwargs["updated_at"], time)
+            if kwargs.get("updated_at", None) and \
+                    type(kwargs["updated_at"]) is str:
+                if not _lazy(kwargs["updated_at"]):
+                    self.updated_at = parse_time(kwargs["updated_at"])
             else:
                 self.updated_at = datetime.utcnow()
             if kwargs.get("id", None) is None:
@@ -44,11 +244,115 @@ class BaseModel:
             self.id = str(uuid.uuid4())
             self.created_at = datetime.utcnow()
             self.updated_at = self.created_at
+        if models.storage_t != "db":
+            object.__setattr__(self, "_cached", None)
+
+    if models.storage_t != "db":
+        def __setattr__(self, name, value):
+            """sets an attribute and keeps the storage indexes current;
+            the read-only relationships, e.g. in a stored or posted
+            dictionary, are left as they are"""
+            if name in _read_only(type(self)):
+                return
+            initializing = getattr(self, "_cached", None) is _initializing
+            old = None if initializing else getattr(self, name, None)
+            if compact and not hasattr(type(self), name):
+                if self._extra is None:
+                    object.__setattr__(self, "_extra", {})
+                self._extra[name] = value
+            else:
+                object.__setattr__(self, name, value)
+            if compact:
+                object.__setattr__(self, "_order",
+                                   _ordered(self._order or (), name))
+            if initializing:
+                return
+            object.__setattr__(self, "_cached", None)
+            models.storage.changed(self, name, old)
+
+        def __delattr__(self, name):
+            """deletes an attribute and keeps the storage indexes current"""
+            old = getattr(self, name, None)
+            super().__delattr__(name)
+            object.__setattr__(self, "_cached", None)
+            models.storage.changed(self, name, old)
+
+        def _restore(self, name, value, missing=False):
+            """sets the attribute name back to value, or unsets it if
+            missing, without the conversions of the model's __setattr__,
+            e.g. the hashing of User.password, nor the storage hook"""
+            if compact and not hasattr(type(self), name):
+                if missing:
+                    if self._extra:
+                        self._extra.pop(name, None)
+                else:
+                    if self._extra is None:
+                        object.__setattr__(self, "_extra", {})
+                    self._extra[name] = value
+            elif missing:
+                try:
+                    object.__delattr__(self, name)
+                except AttributeError:
+                    pass
+            else:
+                object.__setattr__(self, name, value)
+            if compact:
+                object.__setattr__(self, "_order", _ordered(
+                    self._order or (), name, not missing))
+            object.__setattr__(self, "_cached", None)
+
+    if compact:
+        @property
+        def __dict__(self):
+            """the attributes set on the instance, in order of assignment
+            as a regular instance dictionary would hold them"""
+            attributes = {}
+            getters = self._getters
+            for name in self._order or ():
+                try:
+                    attributes[name] = getters[name](self)
+                except (KeyError, AttributeError):
+                    if self._extra and name in self._extra:
+                        attributes[name] = self._extra[name]
+            return attributes
+
+        def __getattr__(self, name):
+            """returns the attribute name without a slot, or the default of
+            an unset slot"""
+            if name in ("_extra", "_cached", "_order"):
+                return None
+            if self._extra and name in self._extra:
+                return self._extra[name]
+            if name in self._defaults:
+                return self._defaults[name]
+            raise AttributeError("'{}' object has no attribute '{}'".format(
+                type(self).__name__, name))
+
+        def __delattr__(self, name):
+            """deletes the attribute name"""
+            old = getattr(self, name, None)
+            if hasattr(type(self), name):
+                object.__delattr__(self, name)
+            elif self._extra and name in self._extra:
+                del self._extra[name]
+            else:
+                raise AttributeError(name)
+            object.__setattr__(self, "_order", _ordered(
+                self._order or (), name, False))
+            object.__setattr__(self, "_cached", None)
+            models.storage.changed(self, name, old)
 
     def __str__(self):
         """String representation of the BaseModel class"""
+        attributes = self.__dict__
+        if lazy_dates:
+            # the dates not parsed yet show as once read
+            attributes = dict(attributes)
+            for name in ("created_at", "updated_at"):
+                if type(attributes.get(name)) is str:
+                    attributes[name] = getattr(self, name)
         return "[{:s}] ({:s}) {}".format(self.__class__.__name__, self.id,
-                                         self.__dict__)
+                                         attributes)
 
     def save(self):
         """updates the attribute 'updated_at' with the current datetime"""
@@ -58,11 +362,23 @@ class BaseModel:
 
     def to_dict(self):
         """returns a dictionary containing all keys/values of the instance"""
+        if models.storage_t == "db":
+            return self._build_dict()
+        # in file storage mode every change goes through __setattr__ or
+        # __delattr__, which drop the dictionary built
+        cached = getattr(self, "_cached", None)
+        if cached is None:
+            cached = self._build_dict()
+            object.__setattr__(self, "_cached", cached)
+        return cached.copy()
+
+    def _build_dict(self):
+        """builds the dictionary returned by to_dict()"""
         new_dict = self.__dict__.copy()
         if "created_at" in new_dict:
-            new_dict["created_at"] = new_dict["created_at"].strftime(time)
+            new_dict["created_at"] = format_time(new_dict["created_at"])
         if "updated_at" in new_dict:
-            new_dict["updated_at"] = new_dict["updated_at"].strftime(time)
+            new_dict["updated_at"] = format_time(new_dict["updated_at"])
         new_dict["__class__"] = self.__class__.__name__
         if "_sa_instance_state" in new_dict:
             del new_dict["_sa_instance_state"]
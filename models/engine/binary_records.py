@@ -0,0 +1,349 @@
+#!/usr/bin/python3
+"""
+Compact binary file format for FileStorage
+
+A file is the header b"HBNB\\x01" followed by one record per object: a
+4-byte little endian length, then the object. Class and attribute names
+known to the models are written as an index into NAMES, and the
+created_at/updated_at strings as microseconds since the epoch.
+
+Records may be appended to a file: a later record of the same key replaces
+the earlier one, and a record holding only the key deletes it.
+"""
+
+from datetime import datetime, timedelta
+import re
+import struct
+
+HEADER = b"HBNB\x01"
+
+# interned names, only ever appended to: files refer to them by position
+NAMES = (
+    "Amenity", "BaseModel", "City", "Place", "Review", "State", "User",
+    "__class__", "id", "created_at", "updated_at", "name", "state_id",
+    "city_id", "user_id", "place_id", "description", "number_rooms",
+    "number_bathrooms", "max_guest", "price_by_night", "latitude",
+    "longitude", "amenity_ids", "text", "email", "password", "first_name",
+    "last_name",
+)
+_name_index = {name: index for index, name in enumerate(NAMES)}
+
+# value tags
+_NONE, _FALSE, _TRUE, _INT, _FLOAT, _STR, _TIME, _NAME, _LIST, _DICT, \
+    _KEY_ID, _KEY_CLASS = range(12)
+
+_length = struct.Struct("<I")
+_double = struct.Struct("<d")
+_epoch = datetime(1970, 1, 1)
+_time_pattern = re.compile(
+    r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{6}\Z", re.ASCII)
+
+
+class BinaryFormat:
+    """reads and writes FileStorage files in the binary format"""
+
+    extension = ".bin"
+
+    @staticmethod
+    def open(path):
+        """opens the file at path for reading"""
+        return open(path, 'rb')
+
+    @staticmethod
+    def encode(key, value):
+        """returns the record of the object dictionary value stored under
+        key, or the record deleting key if value is None"""
+        out = bytearray()
+        name, _, key_id = key.partition(".")
+        _write_name(out, name)
+        _write_str(out, key_id)
+        if value is None:
+            return bytes(out)
+        _write_uint(out, len(value))
+        for field, item in value.items():
+            _write_name(out, field)
+            _write_value(out, item, name, key_id)
+        return bytes(out)
+
+    @staticmethod
+    def decode(record):
+        """returns the object dictionary of record"""
+        name, pos = _read_name(record, 0)
+        key_id, pos = _read_str(record, pos)
+        count, pos = _read_uint(record, pos)
+        value = {}
+        for _ in range(count):
+            field, pos = _read_name(record, pos)
+            value[field], pos = _read_value(record, pos, name, key_id)
+        return value
+
+    @staticmethod
+    def fields(record, names):
+        """returns the {name: value} of the fields names of record,
+        skipping the other values without decoding them"""
+        name, pos = _read_name(record, 0)
+        key_id, pos = _read_str(record, pos)
+        count, pos = _read_uint(record, pos)
+        found = {}
+        for _ in range(count):
+            field, pos = _read_name(record, pos)
+            if field not in names:
+                pos = _skip_value(record, pos)
+                continue
+            found[field], pos = _read_value(record, pos, name, key_id)
+            if len(found) == len(names):
+                break
+        return found
+
+    @staticmethod
+    def records(f):
+        """
+        Yields the objects of the binary file f one at a time.
+
+        Args:
+            f (file): The file, opened for reading bytes.
+
+        Yields:
+            tuple: (<class name>.id, record, None) for each record, record
+            being None for the ones deleting the object of the key.
+        """
+        if f.read(len(HEADER)) != HEADER:
+            raise ValueError("not a binary storage file")
+        while True:
+            size = f.read(_length.size)
+            if not size:
+                return
+            if len(size) != _length.size:
+                raise ValueError("unexpected end of file")
+            record = f.read(_length.unpack(size)[0])
+            if len(record) != _length.unpack(size)[0]:
+                raise ValueError("unexpected end of file")
+            key, deleted = record_key(record, 0, len(record))
+            yield key, None if deleted else record, None
+
+    @staticmethod
+    def dump(items):
+        """returns the content of a file holding the (<class name>.id,
+        record) pairs items"""
+        parts = [HEADER]
+        for _, record in items:
+            parts.append(_length.pack(len(record)))
+            parts.append(record)
+        return b"".join(parts)
+
+
+def record_key(data, pos, end):
+    """
+    Reads the key of a record.
+
+    Args:
+        data (bytes): A buffer holding the record, e.g. a memory map.
+        pos (int): The offset of the record in data, after its length.
+        end (int): The offset of the end of the record.
+
+    Returns:
+        tuple: (<class name>.id, True if the record deletes the object).
+    """
+    name, pos = _read_name(data, pos)
+    key_id, pos = _read_str(data, pos)
+    return name + "." + key_id, pos == end
+
+
+def _write_uint(out, number):
+    """appends the unsigned integer number as a varint"""
+    while number >= 0x80:
+        out.append((number & 0x7F) | 0x80)
+        number >>= 7
+    out.append(number)
+
+
+def _read_uint(data, pos):
+    """returns the varint at pos and the position after it"""
+    byte = data[pos]
+    if byte < 0x80:
+        return byte, pos + 1
+    number = byte & 0x7F
+    shift = 7
+    while True:
+        pos += 1
+        byte = data[pos]
+        number |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return number, pos + 1
+        shift += 7
+
+
+def _skip_uint(data, pos):
+    """returns the position after the varint at pos"""
+    while data[pos] >= 0x80:
+        pos += 1
+    return pos + 1
+
+
+def _write_str(out, string):
+    """appends the length prefixed UTF-8 bytes of string"""
+    data = string.encode("utf-8")
+    _write_uint(out, len(data))
+    out += data
+
+
+def _read_str(data, pos):
+    """returns the string at pos and the position after it"""
+    size, pos = _read_uint(data, pos)
+    return data[pos:pos + size].decode("utf-8"), pos + size
+
+
+def _write_name(out, name):
+    """appends name as its index in NAMES plus one, or 0 and the string"""
+    index = _name_index.get(name)
+    if index is None:
+        out.append(0)
+        _write_str(out, name)
+    else:
+        _write_uint(out, index + 1)
+
+
+def _read_name(data, pos):
+    """returns the name at pos and the position after it"""
+    index, pos = _read_uint(data, pos)
+    if index == 0:
+        return _read_str(data, pos)
+    return NAMES[index - 1], pos
+
+
+def _write_value(out, value, name, key_id):
+    """appends the tagged JSON value, name and key_id being the class name
+    and id of the key of the object holding it"""
+    if value is None:
+        out.append(_NONE)
+    elif value is True:
+        out.append(_TRUE)
+    elif value is False:
+        out.append(_FALSE)
+    elif isinstance(value, int):
+        out.append(_INT)
+        _write_uint(out, value * 2 if value >= 0 else -value * 2 - 1)
+    elif isinstance(value, float):
+        out.append(_FLOAT)
+        out += _double.pack(value)
+    elif isinstance(value, str):
+        _write_string_value(out, value, name, key_id)
+    elif isinstance(value, list):
+        out.append(_LIST)
+        _write_uint(out, len(value))
+        for item in value:
+            _write_value(out, item, name, key_id)
+    elif isinstance(value, dict):
+        out.append(_DICT)
+        _write_uint(out, len(value))
+        for field, item in value.items():
+            _write_str(out, field)
+            _write_value(out, item, name, key_id)
+    else:
+        raise TypeError("Object of type {} is not JSON serializable"
+                        .format(type(value).__name__))
+
+
+def _write_string_value(out, value, name, key_id):
+    """appends the tagged string value, using the shortest of its forms
+    that reads back as the same string"""
+    if value == key_id:
+        out.append(_KEY_ID)
+    elif value == name:
+        out.append(_KEY_CLASS)
+    elif value in _name_index:
+        out.append(_NAME)
+        _write_uint(out, _name_index[value])
+    elif _time_pattern.match(value):
+        try:
+            delta = datetime(
+                int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                int(value[11:13]), int(value[14:16]), int(value[17:19]),
+                int(value[20:26])) - _epoch
+        except ValueError:
+            # e.g. a 13th month, kept as a string
+            out.append(_STR)
+            _write_str(out, value)
+            return
+        micros = (delta.days * 86400 + delta.seconds) * 1000000 + \
+            delta.microseconds
+        out.append(_TIME)
+        _write_uint(out, micros * 2 if micros >= 0 else -micros * 2 - 1)
+    else:
+        out.append(_STR)
+        _write_str(out, value)
+
+
+def _skip_value(data, pos):
+    """returns the position after the tagged value at pos"""
+    tag = data[pos]
+    pos += 1
+    if tag == _STR:
+        size, pos = _read_uint(data, pos)
+        return pos + size
+    if tag in (_TIME, _NAME, _INT):
+        return _skip_uint(data, pos)
+    if tag == _FLOAT:
+        return pos + _double.size
+    if tag in (_KEY_ID, _KEY_CLASS, _NONE, _TRUE, _FALSE):
+        return pos
+    if tag == _LIST:
+        count, pos = _read_uint(data, pos)
+        for _ in range(count):
+            pos = _skip_value(data, pos)
+        return pos
+    if tag == _DICT:
+        count, pos = _read_uint(data, pos)
+        for _ in range(count):
+            size, pos = _read_uint(data, pos)
+            pos = _skip_value(data, pos + size)
+        return pos
+    raise ValueError("unknown value tag {}".format(tag))
+
+
+def _read_value(data, pos, name, key_id):
+    """returns the tagged value at pos and the position after it"""
+    tag = data[pos]
+    pos += 1
+    if tag == _STR:
+        return _read_str(data, pos)
+    if tag == _TIME:
+        number, pos = _read_uint(data, pos)
+        micros = number >> 1 if not number & 1 else -(number >> 1) - 1
+        moment = _epoch + timedelta(microseconds=micros)
+        return ("{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}.{:06d}".format(
+            moment.year, moment.month, moment.day, moment.hour,
+            moment.minute, moment.second, moment.microsecond), pos)
+    if tag == _KEY_ID:
+        return key_id, pos
+    if tag == _KEY_CLASS:
+        return name, pos
+    if tag == _NAME:
+        index, pos = _read_uint(data, pos)
+        return NAMES[index], pos
+    if tag == _INT:
+        number, pos = _read_uint(data, pos)
+        return (number >> 1 if not number & 1 else -(number >> 1) - 1), pos
+    if tag == _FLOAT:
+        return _double.unpack_from(data, pos)[0], pos + _double.size
+    if tag == _NONE:
+        return None, pos
+    if tag == _TRUE:
+        return True, pos
+    if tag == _FALSE:
+        return False, pos
+    if tag == _LIST:
+        count, pos = _read_uint(data, pos)
+        items = []
+        for _ in range(count):
+            item, pos = _read_value(data, pos, name, key_id)
+            items.append(item)
+        return items, pos
+    if tag == _DICT:
+        count, pos = _read_uint(data, pos)
+        items = {}
+        for _ in range(count):
+            field, pos = _read_str(data, pos)
+            items[field], pos = _read_value(data, pos, name, key_id)
+        return items, pos
+    raise ValueError("unknown value tag {}".format(tag))
@@ -3,12 +3,20 @@
 Contains the class DBStorage
 """
 
+from collections import OrderedDict
+from contextlib import contextmanager
 from os import getenv
-from sqlalchemy import create_engine
+import threading
+import time
+from sqlalchemy import create_engine, event, func, inspect, select
 from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
 from models.amenity import Amenity
 from models.base_model import Base
 from models.city import City
+from models.engine.query import Query, operators
 from models.place import Place
 from models.review import Review
 from models.state import State
@@ -20,26 +28,170 @@ classes = {
     "State": State, "User": User
 }
 
+# classes of the read-mostly rows kept by the row cache of DBStorage.get()
+cached = ("Amenity", "State")
+
+
+class DBQuery(Query):
+    """query compiled to one SQL statement, with WHERE, ORDER BY and LIMIT
+    clauses"""
+
+    def __init__(self, session, cls):
+        """initializes the query of every row of cls in session"""
+        super().__init__(classes.get(cls, cls))
+        self.session = session
+
+    def _statement(self, ordered=True):
+        """returns the SQLAlchemy query of the conditions, ordered and
+        limited unless ordered is False"""
+        statement = self.session.query(self.cls)
+        for attribute, op, value in self.conditions:
+            column = getattr(self.cls, attribute)
+            if op == "in":
+                statement = statement.filter(column.in_(value))
+            else:
+                statement = statement.filter(operators[op](column, value))
+        if ordered:
+            statement = statement.order_by(*[
+                getattr(self.cls, attribute).desc() if descending
+                else getattr(self.cls, attribute).asc()
+                for attribute, descending in self.ordering])
+            if self.max_results is not None:
+                statement = statement.limit(self.max_results)
+        return statement
+
+    def _results(self):
+        """runs the query and returns the list of its objects"""
+        return self._statement().all()
+
+    def count(self):
+        """returns the number of rows of the query, counted by the
+        database"""
+        count = self._statement(ordered=False).count()
+        if self.max_results is not None:
+            count = min(count, self.max_results)
+        return count
+
+
+class RowCache:
+    """process-wide LRU cache of copies of rows detached from any session,
+    by (class name, id), each one expiring ttl seconds after it's stored"""
+
+    def __init__(self, size, ttl):
+        """initializes an empty cache of at most size rows"""
+        self.size = size
+        self.ttl = ttl
+        # OrderedDict - {(class name, id): (expiry time, row)}, least
+        # recently used first
+        self.rows = OrderedDict()
+        # integer - number of invalidations, so that a row read before one
+        # isn't stored after it
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """returns the row stored under key, or None"""
+        with self.lock:
+            entry = self.rows.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.rows.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self.rows[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, row, version):
+        """stores row under key, unless the cache was invalidated since
+        version"""
+        with self.lock:
+            if version != self.version:
+                return
+            self.rows[key] = (time.monotonic() + self.ttl, row)
+            self.rows.move_to_end(key)
+            while len(self.rows) > self.size:
+                self.rows.popitem(last=False)
+
+    def discard(self, keys):
+        """removes the rows of keys"""
+        with self.lock:
+            self.version += 1
+            for key in keys:
+                self.rows.pop(key, None)
+
+    def clear(self):
+        """removes every row"""
+        with self.lock:
+            self.version += 1
+            self.rows.clear()
+
+    def stats(self):
+        """returns the number of rows, hits and misses and the hit ratio"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"rows": len(self.rows), "hits": self.hits,
+                    "misses": self.misses,
+                    "ratio": self.hits / lookups if lookups else None}
+
+
+def detached_copy(obj):
+    """returns a copy of the columns of the row obj, detached from any
+    session, for Session.merge(load=False)"""
+    mapper = inspect(obj).mapper
+    copy = mapper.class_manager.new_instance()
+    for attribute in mapper.column_attrs:
+        set_committed_value(copy, attribute.key, getattr(obj, attribute.key))
+    make_transient_to_detached(copy)
+    return copy
+
+
+def _written(session):
+    """returns the set of the (class name, id) of the cached classes
+    written by the transaction of session"""
+    return session.info.setdefault("written", set())
+
 
 class DBStorage:
     """interacts with the MySQL database"""
     __engine = None
     __session = None
+    # depth of the batch() blocks of each thread, as sessions are
+    __batches = threading.local()
+
+    # RowCache - copies of the rows of the cached classes read by get(),
+    # shared by the sessions of the process, None if disabled
+    # (HBNB_DB_CACHE_SIZE rows, 0 by default, each kept HBNB_DB_CACHE_TTL
+    # seconds, 60 by default)
+    row_cache = RowCache(int(getenv("HBNB_DB_CACHE_SIZE", "0")),
+                         float(getenv("HBNB_DB_CACHE_TTL", "60"))) \
+        if int(getenv("HBNB_DB_CACHE_SIZE", "0")) > 0 else None
+
+    # dictionary - lookups of get() found in the identity map of the
+    # session or not
+    __lookups = {"hits": 0, "misses": 0}
+    __lookups_lock = threading.Lock()
 
     def __init__(self):
         """Instantiate a DBStorage object"""
+        HBNB_ENV = getenv('HBNB_ENV')
+        self.__engine = self._create_engine()
+        if HBNB_ENV == "test":
+            Base.metadata.drop_all(self.__engine)
+
+    def _create_engine(self):
+        """returns the engine of the MySQL database"""
         HBNB_MYSQL_USER = getenv('HBNB_MYSQL_USER')
         HBNB_MYSQL_PWD = getenv('HBNB_MYSQL_PWD')
         HBNB_MYSQL_HOST = getenv('HBNB_MYSQL_HOST')
         HBNB_MYSQL_DB = getenv('HBNB_MYSQL_DB')
-        HBNB_ENV = getenv('HBNB_ENV')
-        self.__engine = create_engine('mysql+mysqldb://{}:{}@{}/{}'.
-                                      format(HBNB_MYSQL_USER,
-                                             HBNB_MYSQL_PWD,
-                                             HBNB_MYSQL_HOST,
-                                             HBNB_MYSQL_DB))
-        if HBNB_ENV == "test":
-            Base.metadata.drop_all(self.__engine)
+        return create_engine('mysql+mysqldb://{}:{}@{}/{}'.
+                             format(HBNB_MYSQL_USER,
+                                    HBNB_MYSQL_PWD,
+                                    HBNB_MYSQL_HOST,
+                                    HBNB_MYSQL_DB))
 
     def all(self, cls=None):
         """query on the current database session"""
@@ -52,14 +204,51 @@ class DBStorage:
                     new_dict[key] = obj
         return (new_dict)
 
+    def query(self, cls):
+        """
+        Returns the query of the rows of a class.
+
+        Args:
+            cls (type): The class, or class name, of the rows.
+
+        Returns:
+            DBQuery: The query, to refine with filter(), order_by() and
+            limit() and to run with all(), first(), count() or a loop.
+        """
+        return DBQuery(self.__session, cls)
+
     def new(self, obj):
         """add the object to the current database session"""
         self.__session.add(obj)
 
     def save(self):
-        """commit all changes of the current database session"""
+        """commit all changes of the current database session, at the end
+        of the batch() block if called inside one"""
+        if getattr(self.__batches, "depth", 0):
+            return
         self.__session.commit()
 
+    @contextmanager
+    def batch(self):
+        """
+        Groups the commits of the block into one commit at its end.
+
+        If the block raises, the session is rolled back instead. Nested
+        blocks join the outermost one.
+        """
+        depth = getattr(self.__batches, "depth", 0)
+        self.__batches.depth = depth + 1
+        try:
+            yield
+        except BaseException:
+            self.__batches.depth = depth
+            if not depth:
+                self.__session.rollback()
+            raise
+        self.__batches.depth = depth
+        if not depth:
+            self.save()
+
     def delete(self, obj=None):
         """delete from the current database session obj if not None"""
         if obj is not None:
@@ -76,6 +265,25 @@ class DBStorage:
         )
 
         self.__session = scoped_session(session_factory)
+        event.listen(session_factory, "after_flush", self._after_flush)
+        event.listen(session_factory, "after_commit", self._after_end)
+        event.listen(session_factory, "after_rollback", self._after_end)
+
+    @staticmethod
+    def _after_flush(session, flush_context):
+        """records the rows of the cached classes the flush wrote"""
+        for obj in list(session.new) + list(session.dirty) + \
+                list(session.deleted):
+            name = obj.__class__.__name__
+            if name in cached:
+                _written(session).add((name, obj.id))
+
+    def _after_end(self, session):
+        """drops the rows the ending transaction wrote from the row cache,
+        once committed or rolled back"""
+        written = session.info.pop("written", None)
+        if written and self.row_cache is not None:
+            self.row_cache.discard(written)
 
     def close(self):
         """call remove() method on the private session attribute"""
@@ -92,27 +300,95 @@ class DBStorage:
         Returns:
             int: The number of objects in the storage.
         """
-        return len(self.all(cls))
+        if cls is None:
+            return sum(self.counts().values())
+        return sum(self.counts(cls).values())
+
+    def counts(self, *cls):
+        """
+        Returns the number of rows of several tables, counted by one
+        statement of a SELECT COUNT(*) subquery per table.
+
+        Args:
+            *cls: The classes, or class names, of the rows to count, every
+            class if none is given.
+
+        Returns:
+            dict: The number of rows by class name.
+        """
+        counted = [classes.get(model, model) for model in cls] if cls \
+            else list(classes.values())
+        counted = [model for model in counted if model in classes.values()]
+        if not counted:
+            return {}
+        row = self.__session.query(*[
+            select(func.count()).select_from(model).scalar_subquery()
+            for model in counted]).one()
+        return {model.__name__: count for model, count in zip(counted, row)}
 
     def get(self, cls=None, cls_id=None):
         """
         Returns the instance object that has the specified class name and id.
 
+        The object is taken from the identity map of the session when it's
+        there, then from the row cache for the cached classes, and only
+        then queried.
+
         Args:
-            cls (optional): The class name of the object to retrieve.
+            cls (optional): The class, or class name, of the object to
+            retrieve.
             cls_id(optional): The ID of the object
 
         Returns:
-            int: The number of objects in the storage.
+            object: The object, or None if not found.
+        """
+        cls = classes.get(cls, cls)
+        if not cls_id or cls not in classes.values():
+            return None
+        session = self.__session()
+        found = identity_key(cls, cls_id) in session.identity_map
+        with self.__lookups_lock:
+            self.__lookups["hits" if found else "misses"] += 1
+        name = cls.__name__
+        if found or self.row_cache is None or name not in cached:
+            return session.get(cls, cls_id)
+        version = self.row_cache.version
+        row = self.row_cache.get((name, cls_id))
+        if row is not None:
+            return session.merge(row, load=False)
+        obj = session.get(cls, cls_id)
+        if obj is not None and (name, cls_id) not in _written(session):
+            self.row_cache.put((name, cls_id), detached_copy(obj), version)
+        return obj
+
+    def cache_stats(self):
+        """
+        Returns the hits and misses of get() in the identity map of the
+        sessions and in the row cache.
+
+        Returns:
+            dict: {"identity_map": {"hits": ..., "misses": ..., "ratio":
+            ...}} and the "row_cache" statistics if it's enabled, ratios
+            being None before the first lookup.
         """
-        if cls and cls_id:
-            return self.__session.query(cls).filter(cls.id == cls_id).first()
-        return None
+        with self.__lookups_lock:
+            hits, misses = self.__lookups["hits"], self.__lookups["misses"]
+        stats = {"identity_map": {
+            "hits": hits, "misses": misses,
+            "ratio": hits / (hits + misses) if hits + misses else None}}
+        if self.row_cache is not None:
+            stats["row_cache"] = self.row_cache.stats()
+        return stats
 
     def drop_all_tables(self):
         """Drops all tables, useful when testing."""
-        self.__engine.execute('SET FOREIGN_KEY_CHECKS = 0')
+        mysql = self.__engine.dialect.name == "mysql"
+        if mysql:
+            self.__engine.execute('SET FOREIGN_KEY_CHECKS = 0')
         self.__session.rollback()
         Base.metadata.drop_all(self.__engine)
-        self.__engine.execute('SET FOREIGN_KEY_CHECKS = 1')
+        if mysql:
+            self.__engine.execute('SET FOREIGN_KEY_CHECKS = 1')
+        if self.row_cache is not None:
+            self.row_cache.clear()
         self.reload()
@@ -3,19 +3,269 @@
 Contains the FileStorage class
 """
 
-import json
+import atexit
+import bisect
+from contextlib import contextmanager
+from datetime import datetime
+import heapq
+import itertools
+import os
+from os import getenv
+import re
+import stat
+import struct
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import zlib
+try:
+    import fcntl
+except ImportError:
+    # no advisory locks outside Unix: shared mode only orders the writes
+    # of one process
+    fcntl = None
 from models.amenity import Amenity
-from models.base_model import BaseModel
+from models.base_model import BaseModel, format_time
 from models.city import City
 from models.place import Place
 from models.review import Review
 from models.state import State
 from models.user import User
 from models import FILE_PATH
+from models.engine import json_codec
+from models.engine.binary_records import BinaryFormat
+from models.engine.json_records import JsonFormat
+from models.engine.query import Query, operators
+from models.engine.record_store import RecordStore
 
 classes = {"Amenity": Amenity, "BaseModel": BaseModel, "City": City,
            "Place": Place, "Review": Review, "State": State, "User": User}
 
+# foreign key attributes indexed in reverse for the file mode relationships
+foreign_keys = {"Amenity": ("place_id",), "City": ("state_id",),
+                "Place": ("city_id", "user_id"),
+                "Review": ("place_id", "user_id")}
+
+# classes whose objects are also indexed in order of their name, as a whole
+# and per value of each of their foreign keys
+named = ("Amenity", "City", "Place", "State")
+
+# string attributes interned when an object is loaded, so that all the
+# objects holding the same id or low cardinality name share one string
+interned = {"Amenity": ("id", "place_id", "name"), "BaseModel": ("id",),
+            "City": ("id", "state_id"),
+            "Place": ("id", "city_id", "user_id", "amenity_ids"),
+            "Review": ("id", "place_id", "user_id"), "State": ("id",),
+            "User": ("id",)}
+
+# on-disk formats, by HBNB_FILE_FORMAT value
+formats = {"json": JsonFormat, "binary": BinaryFormat}
+
+# change sequence number at the start of the lock file in shared mode
+sequence = struct.Struct("<Q")
+
+
+def env_flag(name):
+    """returns True if the environment variable name is set to a yes value"""
+    return getenv(name, "").lower() in ("1", "true", "yes", "on")
+
+
+def write_atomic(path, data):
+    """writes the text or bytes data to path through a synced temporary
+    file renamed over it, so that after a crash path holds either its old
+    or its new content"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except OSError:
+            mode = 0o644
+        os.chmod(tmp_path, mode)
+        if isinstance(data, bytes):
+            f = os.fdopen(fd, 'wb')
+        else:
+            f = os.fdopen(fd, 'w', encoding="utf-8")
+        with f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    try:
+        # makes the rename itself durable
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+class SortedKeys:
+    """(sort key of the name, <class name>.id, object) entries kept in
+    order, the entries added or removed since the last read being merged
+    in by the next one"""
+
+    def __init__(self):
+        """initializes an empty index"""
+        self.entries = []
+        self.added = set()
+        self.removed = set()
+
+    def add(self, entry):
+        """adds entry"""
+        if entry in self.removed:
+            self.removed.discard(entry)
+        else:
+            self.added.add(entry)
+
+    def remove(self, entry):
+        """removes entry, which must have been added"""
+        if entry in self.added:
+            self.added.discard(entry)
+        else:
+            self.removed.add(entry)
+
+    def sorted(self):
+        """returns the sorted list of the entries, not to be changed"""
+        entries = self.entries
+        if self.removed:
+            if len(self.removed) * 32 < len(entries):
+                for entry in self.removed:
+                    del entries[bisect.bisect_left(entries, entry)]
+            else:
+                entries = [entry for entry in entries
+                           if entry not in self.removed]
+            self.removed = set()
+        if self.added:
+            if len(self.added) * 32 < len(entries):
+                for entry in self.added:
+                    bisect.insort(entries, entry)
+            else:
+                # two sorted runs, merged by the sort
+                entries.extend(sorted(self.added))
+                entries.sort()
+            self.added = set()
+        self.entries = entries
+        return entries
+
+
+class FileQuery(Query):
+    """query on the objects of a FileStorage, starting from the object of
+    an id or the index of a foreign key when a condition is an equality on
+    them, or reading the name indexes when sorted by name"""
+
+    def __init__(self, storage, cls):
+        """initializes the query of every object of cls in storage"""
+        super().__init__(cls)
+        self.storage = storage
+
+    def _candidates(self):
+        """returns the objects to check the conditions on and the
+        conditions left to check"""
+        name = FileStorage._class_name(self.cls)
+        for position, (attribute, op, value) in enumerate(self.conditions):
+            if op != "eq":
+                continue
+            others = (self.conditions[:position] +
+                      self.conditions[position + 1:])
+            if attribute == "id":
+                obj = self.storage.get(self.cls, value)
+                return [obj] if obj is not None else [], others
+            if attribute in foreign_keys.get(name, ()):
+                return list(self.storage.related(self.cls, attribute,
+                                                 value).values()), others
+        return list(self.storage.all(self.cls).values()), self.conditions
+
+    def _by_name(self):
+        """returns the objects of the query read in order from the name
+        indexes, or None if it isn't sorted by name only"""
+        name = FileStorage._class_name(self.cls)
+        if name not in named or len(self.ordering) != 1 or \
+                self.ordering[0][0] != "name" or \
+                ("id", "eq") in [condition[:2]
+                                 for condition in self.conditions]:
+            return None
+        foreign_key = value = None
+        conditions = self.conditions
+        for position, (attribute, op, expected) in enumerate(conditions):
+            if op == "eq" and attribute in foreign_keys.get(name, ()):
+                foreign_key, value = attribute, expected
+                conditions = conditions[:position] + conditions[position + 1:]
+                break
+        objects = self.storage.sorted_by_name(self.cls, foreign_key, value)
+        if self.ordering[0][1]:
+            objects.reverse()
+        if conditions:
+            objects = (obj for obj in objects if _matches(obj, conditions))
+        return list(itertools.islice(objects, self.max_results))
+
+    def _results(self):
+        """runs the query and returns the list of its objects"""
+        objects = self._by_name()
+        if objects is not None:
+            return objects
+        objects, conditions = self._candidates()
+        if conditions:
+            objects = [obj for obj in objects if _matches(obj, conditions)]
+        if self.ordering:
+            directions = set(descending for _, descending in self.ordering)
+            if self.max_results is not None and len(directions) == 1:
+                # only the first max_results are sorted
+                choose = heapq.nlargest if True in directions \
+                    else heapq.nsmallest
+                return choose(self.max_results, objects, key=lambda obj: [
+                    _sort_key(obj, attribute)
+                    for attribute, _ in self.ordering])
+            for attribute, descending in reversed(self.ordering):
+                objects.sort(key=lambda obj: _sort_key(obj, attribute),
+                             reverse=descending)
+        if self.max_results is not None:
+            objects = objects[:self.max_results]
+        return objects
+
+    def count(self):
+        """returns the number of objects of the query, without building
+        the list of the objects of a class if it has no conditions"""
+        if self.conditions:
+            return super().count()
+        count = self.storage.count(self.cls)
+        if self.max_results is not None:
+            count = min(count, self.max_results)
+        return count
+
+
+def _matches(obj, conditions):
+    """returns True if obj matches the (attribute, operator name, value)
+    conditions, a comparison to a missing or None attribute being false as
+    in SQL"""
+    for attribute, op, value in conditions:
+        current = getattr(obj, attribute, None)
+        if current is None and value is not None:
+            return False
+        try:
+            if not operators[op](current, value):
+                return False
+        except TypeError:
+            return False
+    return True
+
+
+def _sort_key(obj, attribute):
+    """returns the sort key of obj by attribute, None first as in SQL"""
+    value = getattr(obj, attribute, None)
+    return (value is not None, value)
+
 
 class FileStorage:
     """serializes instances to a JSON file & deserializes back to instances"""
@@ -23,54 +273,1057 @@ class FileStorage:
     # string - path to the JSON file
     __file_path = FILE_PATH
 
+    # boolean - memory-map the binary file, keeping only the location of
+    # each record in memory, and append the changes of each save to it
+    # (HBNB_FILE_MMAP, single file layout)
+    mapped = env_flag("HBNB_FILE_MMAP")
+
+    # class - format of the files, JsonFormat or the more compact
+    # BinaryFormat (HBNB_FILE_FORMAT=json or binary, binary by default
+    # when mapped)
+    file_format = formats[getenv("HBNB_FILE_FORMAT",
+                                 "binary" if mapped else "json")]
+
+    # boolean - append the changes of each save to a journal next to the
+    # JSON file instead of rewriting the whole file (HBNB_FILE_JOURNAL)
+    journal = env_flag("HBNB_FILE_JOURNAL")
+
+    # integer - journal size in bytes past which it is folded back into
+    # the JSON file (HBNB_JOURNAL_MAX_SIZE)
+    journal_max_size = int(getenv("HBNB_JOURNAL_MAX_SIZE", 1 << 20))
+
+    # float - seconds a save() waits for saves of other threads to join
+    # its write (HBNB_GROUP_COMMIT_MS)
+    group_commit_window = float(getenv("HBNB_GROUP_COMMIT_MS", 0)) / 1000
+
+    # boolean - store each class in its own files under <__file_path>.d,
+    # loaded the first time the class is used (HBNB_FILE_LAYOUT=sharded)
+    sharded = getenv("HBNB_FILE_LAYOUT") == "sharded"
+
+    # integer - number of files each class is split into by a hash of the
+    # keys in the sharded layout (HBNB_FILE_SHARDS)
+    shards = int(getenv("HBNB_FILE_SHARDS", 1))
+
+    # boolean - keep the encoded form of loaded objects and only build them
+    # the first time they are accessed (HBNB_FILE_LAZY)
+    lazy = env_flag("HBNB_FILE_LAZY")
+
+    # boolean - keep the encoded form of every object loaded or saved,
+    # rather than of the objects not built yet only: a save then only
+    # encodes the changed objects and a reload only rebuilds the ones whose
+    # encoded form changed, for about as much memory again as the objects
+    # (HBNB_FILE_KEEP_TEXT)
+    keep_encoded = env_flag("HBNB_FILE_KEEP_TEXT")
+
+    # boolean - share the files with other processes: writes hold a lock on
+    # <__file_path>.lock, which counts them, and the changes other processes
+    # saved are merged before each write and read (HBNB_FILE_SHARED)
+    shared = env_flag("HBNB_FILE_SHARED")
+
+    # boolean - save() only marks the changes to be written by a
+    # background thread, or by flush() (HBNB_FILE_WRITE_BEHIND)
+    write_behind = env_flag("HBNB_FILE_WRITE_BEHIND")
+
+    # float - seconds between two background writes
+    # (HBNB_FLUSH_INTERVAL_MS)
+    flush_interval = float(getenv("HBNB_FLUSH_INTERVAL_MS", 1000)) / 1000
+
+    # integer - number of changed objects that starts a background write
+    # before the interval is over (HBNB_FLUSH_THRESHOLD)
+    flush_threshold = int(getenv("HBNB_FLUSH_THRESHOLD", 1000))
+
     # dictionary - empty but will store all objects by <class name>.id
     __objects = {}
 
+    # dictionary - the same objects partitioned by class name:
+    # {<class name>: {<class name>.id: obj}}
+    __by_class = {}
+
+    # integer - number of objects held in __by_class
+    __indexed = 0
+
+    # dictionary - reverse foreign key indexes:
+    # {(<class name>, <foreign key>): {<value>: {<class name>.id: obj}}}
+    __by_foreign_key = {}
+
+    # dictionary - objects of the named classes in order of name:
+    # {(<class name>, None, None): SortedKeys} for each class and
+    # {(<class name>, <foreign key>, <value>): SortedKeys} for each value
+    # of its foreign keys
+    __by_name = {}
+
+    # dictionary - entry of each object in __by_name and the values of its
+    # foreign keys: {<class name>.id: (entry, ((<foreign key>, <value>),
+    # ...))}
+    __names = {}
+
+    # set - <class name>.id of the objects created, changed or deleted
+    # since the last save
+    __changed = set()
+
+    # dictionary - encoded form (JSON text or binary record) of the objects
+    # as written by the last save or read by the last reload, by
+    # <class name>.id; unless keep_encoded, only of the objects not built
+    # yet and, as before their batch, of the ones held by a batch
+    __encoded = {}
+
+    # dictionary - _stamp() of each file as of the last load or save
+    __stamps = {}
+
+    # set - names of the classes loaded in the sharded layout
+    __loaded = set()
+
+    # dictionary - <class name>.id of the objects loaded but not built yet
+    # in lazy mode, by class name; their encoded form is in __encoded, or
+    # in __store when mapped
+    __pending = {}
+
+    # dictionary - reverse foreign key indexes of the objects not built yet
+    # in lazy mode, read from their encoded form on the first relationship
+    # access to their class:
+    # {(<class name>, <foreign key>): {<value>: {<class name>.id}}}; a key
+    # may stay after its object is built or removed
+    __pending_by_foreign_key = {}
+
+    # set - names of the classes whose objects not built yet are in
+    # __pending_by_foreign_key: read on the first relationship access, so
+    # that reload only reads the keys
+    __pending_indexed = set()
+
+    # RecordStore - the memory-mapped file when mapped
+    __store = None
+
+    # integer - offset of the end of the last complete record of the
+    # journal as of its last replay or append, None if unknown
+    __journal_size = None
+
+    # group commit: number of save() calls so far, number of them covered
+    # by a finished write and whether a thread is writing for the group
+    __commit = threading.Condition()
+    __requested = 0
+    __written = 0
+    __writing = False
+
+    # lock - held while writing the files or changing the objects
+    __write_lock = threading.RLock()
+
+    # snapshots: number of changes made to the partitions so far, number
+    # of the last change of each class, and the (<number of changes>,
+    # {<class name>.id: obj}) snapshot of each partition, never changed once
+    # published; __local.version is the last change made by each thread
+
+    # batches: __local.batch is the depth of the batch() blocks of each
+    # thread and __local.undo the list of what its outermost block changed
+    __version = 0
+    __versions = {}
+    __views = {}
+    __local = threading.local()
+
+    # dictionary - number of open batches, of any thread, that changed each
+    # <class name>.id: the writes made until they end keep these objects
+    # as last saved
+    __held = {}
+
+    # shared mode: descriptor of the lock file, opened by the process of id
+    # __lock_pid, and change sequence number of the files as last loaded
+    __lock_fd = None
+    __lock_pid = None
+    __sequence = None
+
+    # write-behind: condition the background thread waits on, id of the
+    # process it runs in and whether save() was called since its last write
+    __flusher = threading.Condition()
+    __flusher_pid = None
+    __dirty = False
+
     def all(self, cls=None):
-        """returns the dictionary __objects"""
+        """returns the dictionary __objects
+
+        With cls, returns a copy of a consistent snapshot of its objects,
+        taken without waiting for the threads changing them.
+        """
+        self._sync()
         if cls is not None:
-            new_dict = {}
-            for key, value in self.__objects.items():
-                if cls in [value.__class__, value.__class__.__name__]:
-                    new_dict[key] = value
-            return new_dict
+            return dict(self._view(self._class_name(cls)))
+        self._load_all()
+        for name in list(self.__pending):
+            self._materialize_class(name)
         return self.__objects
 
+    def query(self, cls):
+        """
+        Returns the query of the objects of a class.
+
+        Args:
+            cls (type): The class, or class name, of the objects.
+
+        Returns:
+            FileQuery: The query, to refine with filter(), order_by() and
+            limit() and to run with all(), first(), count() or a loop.
+        """
+        return FileQuery(self, cls)
+
     def new(self, obj):
         """sets in __objects the obj with key <obj class name>.id"""
         if obj is not None:
+            self._ensure_loaded(obj.__class__.__name__)
             key = obj.__class__.__name__ + "." + obj.id
-            self.__objects[key] = obj
+            with self.__write_lock:
+                self._log_undo(key, None, None)
+                self.__pending.get(obj.__class__.__name__,
+                                   set()).discard(key)
+                self._unindex(key)
+                self.__objects[key] = obj
+                self._index(key, obj)
+                self.__changed.add(key)
 
     def save(self):
-        """serializes __objects to the JSON file (path: __file_path)"""
-        json_objects = {}
-        for key, value in self.__objects.items():
-            json_objects[key] = value.to_dict()
+        """serializes __objects to the JSON file (path: __file_path)
+
+        The saves of concurrent threads are grouped: while one thread
+        writes, the others wait and the next write covers all of them.
+        In write-behind mode the write is left to a background thread, and
+        inside a batch() block to the end of the block.
+        """
+        if getattr(self.__local, "batch", 0):
+            return
+        if self.write_behind:
+            self._schedule_flush()
+            return
+        self._commit_group()
+
+    def flush(self, wait=True):
+        """
+        Writes the changes saved so far in write-behind mode.
+
+        Args:
+            wait (bool): If True, returns once they are written and raises
+            the error of the write if it failed. Otherwise only wakes the
+            background thread up.
+        """
+        if not self.write_behind:
+            # save() already wrote them
+            return
+        if not wait:
+            with self.__flusher:
+                self.__flusher.notify()
+            return
+        with self.__flusher:
+            FileStorage.__dirty = False
+        self._commit_group()
+
+    @contextmanager
+    def batch(self):
+        """
+        Groups the saves of the block, e.g. of many new objects, into one
+        save at its end.
+
+        If the block raises, the objects it added, replaced or deleted and
+        the attributes it set are restored instead, and nothing is saved.
+        Batches are per thread, and nested ones join the outermost one.
+        """
+        depth = getattr(self.__local, "batch", 0)
+        self.__local.batch = depth + 1
+        if depth:
+            try:
+                yield
+            finally:
+                self.__local.batch = depth
+            return
+        self.__local.undo = []
+        self.__local.logged = set()
+        try:
+            yield
+        except BaseException:
+            self.__local.batch = 0
+            try:
+                self._rollback()
+            finally:
+                self._release()
+            raise
+        else:
+            self.__local.batch = 0
+            self._release()
+            self.save()
+        finally:
+            self.__local.batch = 0
+            self.__local.undo = None
+            self.__local.logged = None
+
+    def _log_undo(self, key, obj, name):
+        """records in the undo log of the current batch how to restore
+        the object of key, or its attribute name, before its first change
+        in the batch"""
+        if not getattr(self.__local, "batch", 0):
+            return
+        logged = self.__local.logged
+        if key not in logged:
+            logged.add(key)
+            with self.__write_lock:
+                self.__held[key] = self.__held.get(key, 0) + 1
+                if not self.keep_encoded and self._record(key) is None:
+                    self._keep_record(key, obj, name)
+            self.__local.undo.append(
+                (key, None, self.__objects.get(key), key in self.__changed))
+        if name is not None and (key, name) not in logged:
+            logged.add((key, name))
+            self.__local.undo.append((key, name, obj, None))
+
+    def _rollback(self):
+        """undoes the changes logged by the current batch, latest first"""
+        with self.__write_lock:
+            for key, name, value, was_changed in reversed(self.__local.undo):
+                if name is not None:
+                    # the value as stored, e.g. a password already hashed
+                    obj, old = value
+                    current = getattr(obj, name, None)
+                    # None for an attribute that didn't exist
+                    obj._restore(name, old,
+                                 old is None and not hasattr(type(obj), name))
+                    self.changed(obj, name, current)
+                    continue
+                self._unindex(key)
+                if value is None:
+                    self.__objects.pop(key, None)
+                else:
+                    self.__objects[key] = value
+                    self._index(key, value)
+                if not was_changed:
+                    self.__changed.discard(key)
+
+    def _keep_record(self, key, change, name):
+        """keeps the encoded form of the object of key as it was before
+        the current batch, for the writes made while the batch holds it:
+        before the change of its attribute name from change, an
+        (obj, old value) pair, or as it is if name is None"""
+        obj = self.__objects.get(key)
+        if obj is None:
+            return
+        value = obj.to_dict()
+        if name is not None:
+            old = change[1]
+            if old is None and not hasattr(type(obj), name):
+                # the attribute didn't exist
+                value.pop(name, None)
+            else:
+                value[name] = format_time(old) if isinstance(
+                    old, datetime) else old
+        self.__encoded[key] = self.file_format.encode(key, value)
+
+    def _release(self):
+        """lets the writes take the changes of the current batch, which is
+        ending"""
+        with self.__write_lock:
+            for key in self.__local.logged:
+                if type(key) is not str:
+                    # (key, attribute name)
+                    continue
+                if self.__held[key] > 1:
+                    self.__held[key] -= 1
+                    continue
+                del self.__held[key]
+                if (not self.keep_encoded and
+                        key not in self.__pending.get(key.split(".", 1)[0],
+                                                      ())):
+                    self.__encoded.pop(key, None)
+            self.__local.logged = set()
+
+    def _schedule_flush(self):
+        """marks the changes to be written by the background thread,
+        starting it in this process if needed, and wakes it up once
+        flush_threshold objects changed"""
+        with self.__flusher:
+            FileStorage.__dirty = True
+            if FileStorage.__flusher_pid != os.getpid():
+                # first save of the process, or of a forked child
+                FileStorage.__flusher_pid = os.getpid()
+                threading.Thread(target=self._flush_behind, daemon=True,
+                                 name="FileStorage flusher").start()
+                atexit.register(self.flush)
+            if len(self.__changed) >= self.flush_threshold:
+                self.__flusher.notify()
+
+    def _flush_behind(self):
+        """body of the background thread: writes the saved changes every
+        flush_interval seconds, or when woken up"""
+        while True:
+            with self.__flusher:
+                if not (FileStorage.__dirty and
+                        len(self.__changed) >= self.flush_threshold):
+                    self.__flusher.wait(self.flush_interval)
+                if not FileStorage.__dirty:
+                    continue
+                FileStorage.__dirty = False
+            try:
+                self._commit_group()
+            except Exception:
+                # the changes are kept for the next write
+                traceback.print_exc()
+                with self.__flusher:
+                    FileStorage.__dirty = True
+                time.sleep(self.flush_interval)
 
-        with open(self.__file_path, 'w', encoding="utf-8") as f:
-            json.dump(json_objects, f, indent=4)
+    def _commit_group(self):
+        """writes the changes, grouping the calls of concurrent threads"""
+        with self.__commit:
+            FileStorage.__requested += 1
+            ticket = FileStorage.__requested
+            while FileStorage.__written < ticket:
+                if not FileStorage.__writing:
+                    FileStorage.__writing = True
+                    break
+                self.__commit.wait()
+            else:
+                # a write started after this call, so it covered it
+                return
+        try:
+            if self.group_commit_window:
+                time.sleep(self.group_commit_window)
+            with self.__commit:
+                batch = FileStorage.__requested
+            self._flush()
+            with self.__commit:
+                FileStorage.__written = batch
+        finally:
+            with self.__commit:
+                FileStorage.__writing = False
+                self.__commit.notify_all()
+
+    def compact(self):
+        """writes every object to the JSON file and empties the journal"""
+        with self.__write_lock, self._file_lock():
+            changed = self._take_changes()
+            try:
+                self._write(self._segments(), changed)
+            except BaseException:
+                self.__changed.update(changed)
+                raise
+            self._count_write()
+
+    def _flush(self):
+        """writes the changes since the last save to the journal, or the
+        files holding them"""
+        with self.__write_lock, self._file_lock():
+            changed = self._take_changes()
+            try:
+                if len(self.__objects) != FileStorage.__indexed:
+                    # a direct change of __objects can't be traced to its
+                    # files, so every file is written
+                    self._write(self._segments(), changed)
+                elif self._mapped():
+                    self._append_records(changed)
+                elif self.sharded:
+                    self._write({self._segment(key) for key in changed},
+                                changed)
+                elif self.journal:
+                    self._append_journal(changed)
+                    size = os.path.getsize(self._journal_path())
+                    if size > self.journal_max_size:
+                        self._write(self._segments(), set())
+                else:
+                    self._write(self._segments(), changed)
+            except BaseException:
+                self.__changed.update(changed)
+                raise
+            self._count_write()
+
+    def _take_changes(self):
+        """returns the keys changed since the last save and starts a new
+        set for the changes made from now on, keeping the keys of the open
+        batches for the write after their end"""
+        changed = self.__changed
+        if self.__held:
+            FileStorage.__changed = {key for key in changed
+                                     if key in self.__held}
+            changed = {key for key in changed if key not in self.__held}
+        else:
+            FileStorage.__changed = set()
+        return changed
+
+    def _write(self, segments, changed):
+        """atomically writes the files of segments, serializing again only
+        the changed objects, and removes the journal"""
+        if len(self.__objects) != FileStorage.__indexed:
+            self._rebuild_indexes()
+        for segment in sorted(segments, key=str):
+            items = [(key, self._encode(key, obj, changed))
+                     for key, obj in self._segment_items(segment)
+                     if key not in self.__held]
+            # the objects of the open batches, as last saved
+            for key in list(self.__held):
+                record = self._record(key)
+                if self._segment(key) == segment and record is not None:
+                    items.append((key, record))
+            path = self._segment_path(segment)
+            if segment is not None:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_atomic(path, self.file_format.dump(items))
+            self.__stamps[path] = self._stamp(path)
+            if self._mapped():
+                previous = self._open_store()
+                if previous is not None:
+                    previous.close()
+        if self.sharded:
+            self._record_shards({segment[0] for segment in segments})
+        if not self.sharded and os.path.exists(self._journal_path()):
+            os.remove(self._journal_path())
+            self.__stamps[self._journal_path()] = None
+        if not self.sharded:
+            FileStorage.__journal_size = 0
+        for key in changed:
+            if key not in self.__objects:
+                self.__encoded.pop(key, None)
+        pending = sum(len(keys) for keys in list(self.__pending.values()))
+        if len(self.__encoded) > len(self.__objects) + pending:
+            # drops the encoding of objects removed from __objects directly
+            FileStorage.__encoded = {
+                key: text for key, text in list(self.__encoded.items())
+                if key in self.__objects or key in self.__held or
+                key in self.__pending.get(key.split(".", 1)[0], ())}
 
     def reload(self):
-        """deserializes the JSON file to __objects"""
+        """deserializes the JSON file to __objects, then replays the
+        journal on top of it
+
+        Files unchanged since they were last loaded or saved are skipped,
+        and in the sharded layout only the classes already used are read.
+        In write-behind mode the objects changed since the last write are
+        kept.
+        """
+        with self.__write_lock:
+            # saves not written yet in write-behind mode must survive
+            self._reload(self.write_behind)
+
+    def _reload(self, merge):
+        """loads the files changed since they were last loaded or saved,
+        keeping the objects changed since the last save if merge is True
+        and dropping these changes otherwise"""
+        sequence = self._read_sequence()
+        in_sync = ((merge or not self.__changed) and
+                   len(self.__objects) == FileStorage.__indexed)
+        if self._mapped():
+            path = self._segment_path(None)
+            stamp = self._stamp(path)
+            if not in_sync or stamp != self.__stamps.get(path):
+                self._load_store(merge)
+            self.__stamps[path] = stamp
+        else:
+            journal = None if self.sharded else self._journal_path()
+            stamps = {journal: self._stamp(journal)} if journal else {}
+            journal_in_sync = \
+                stamps.get(journal) == self.__stamps.get(journal)
+            for segment in self._segments():
+                path = self._segment_path(segment)
+                stamps[path] = self._stamp(path)
+                if (in_sync and journal_in_sync and
+                        stamps[path] == self.__stamps.get(path)):
+                    # __objects already holds what is in this file
+                    continue
+                self._load_segment(segment, merge)
+            if journal and not (in_sync and journal_in_sync):
+                self._replay_journal(merge)
+            self.__stamps.update(stamps)
+        FileStorage.__sequence = sequence
+
+    def _replay_journal(self, merge=False):
+        """applies the records of the journal to __objects, except the ones
+        of objects changed since the last save if merge is True"""
+        for record in self._journal_records():
+            if self._kept(record["key"], merge):
+                continue
+            self._load(record["key"], record["value"])
+
+    def _journal_records(self):
+        """yields the complete records of the journal, stopping at a record
+        torn by an interrupted append, and sets __journal_size to the end
+        of the last one"""
+        FileStorage.__journal_size = 0
         try:
-            with open(self.__file_path, 'r', encoding="utf-8") as f:
-                jo = json.load(f)
-            for key in jo:
-                self.__objects[key] = classes[jo[key]["__class__"]](**jo[key])
+            with open(self._journal_path(), 'rb') as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # torn record from an interrupted append
+                        break
+                    try:
+                        record = json_codec.codec.loads(line)
+                    except ValueError:
+                        break
+                    FileStorage.__journal_size += len(line)
+                    yield record
         except IOError:
             pass
 
+    def _load_segment(self, segment, merge=False, path=None):
+        """loads the objects of the file of segment that differ from the
+        ones in __objects, and removes the saved objects it no longer
+        holds; the objects changed since the last save are kept if merge is
+        True, and none is removed if the file is path, of another number of
+        shards"""
+        try:
+            f = self.file_format.open(path or self._segment_path(segment))
+        except IOError:
+            return
+        on_disk = set()
+        with f:
+            # one object at a time: its dictionary is dropped once built
+            for key, value, loaded in self.file_format.records(f):
+                name = key.split(".", 1)[0]
+                if self._kept(key, merge):
+                    on_disk.add(key)
+                    continue
+                if value is None:
+                    # deleted by a record appended to a mapped file
+                    on_disk.discard(key)
+                    if key not in self.__changed:
+                        self._load(key, None)
+                    continue
+                on_disk.add(key)
+                if (self.__encoded.get(key) == value and
+                        key not in self.__changed and
+                        (key in self.__objects or
+                         key in self.__pending.get(name, ()))):
+                    continue
+                if self.lazy:
+                    self._load(key, None)
+                    self.__encoded[key] = value
+                    self._defer(key)
+                else:
+                    self._load(key,
+                               loaded or self.file_format.decode(value))
+                    if self.keep_encoded:
+                        self.__encoded[key] = value
+        if path is not None:
+            return
+        for key, _ in self._segment_items(segment):
+            if ((key in self.__encoded or not self.keep_encoded) and
+                    key not in on_disk and key not in self.__changed):
+                self._load(key, None)
+
+    def _kept(self, key, merge):
+        """returns True if a reload must keep the object of key as it is:
+        changed by an open batch, or changed since the last save if merge
+        is True"""
+        return key in self.__held or (merge and key in self.__changed)
+
+    def _mapped(self):
+        """returns True if the file is memory-mapped"""
+        return (self.mapped and not self.sharded and
+                self.file_format is BinaryFormat)
+
+    def _open_store(self):
+        """maps the binary file again and returns the previous RecordStore,
+        or None if it doesn't exist"""
+        previous = self.__store
+        try:
+            FileStorage.__store = RecordStore(self._segment_path(None))
+        except IOError:
+            FileStorage.__store = None
+        return previous
+
+    def _load_store(self, merge=False):
+        """maps the binary file and marks the objects whose record changed
+        as not built yet, or removes them if it no longer holds them; the
+        objects changed since the last save are kept if merge is True"""
+        if not os.path.exists(self._segment_path(None)):
+            return
+        previous = self._open_store()
+        store = self.__store
+        for key in store.index:
+            name = key.split(".", 1)[0]
+            if self._kept(key, merge):
+                continue
+            if (previous is not None and key in previous.index and
+                    key not in self.__changed and
+                    (key in self.__objects or
+                     key in self.__pending.get(name, ())) and
+                    previous.read(key) == store.read(key)):
+                continue
+            self._load(key, None)
+            self._defer(key)
+        if previous is not None:
+            for key in previous.index:
+                if key not in store.index and key not in self.__changed:
+                    self._load(key, None)
+            previous.close()
+
+    def _append_records(self, changed):
+        """appends the records of the changed keys to the mapped file, with
+        a deletion record for the deleted ones, and rewrites the file once
+        more than half of it is replaced records"""
+        store = self.__store
+        if store is None:
+            self._write([None], changed)
+            return
+        records = []
+        for key in changed:
+            obj = self.__objects.get(key)
+            if obj is not None:
+                records.append(self.file_format.encode(key, obj.to_dict()))
+            elif key in store.index:
+                records.append(self.file_format.encode(key, None))
+        if records:
+            store.append(records)
+        path = self._segment_path(None)
+        self.__stamps[path] = self._stamp(path)
+        if store.garbage * 2 > store.size:
+            self._write([None], set())
+
+    def _record(self, key):
+        """returns the encoded form of the object of key as of the last
+        save or reload, None if unknown"""
+        record = self.__encoded.get(key)
+        if (record is None and self._mapped() and
+                self.__store is not None and key in self.__store.index):
+            record = self.__store.read(key)
+        return record
+
+    def _lock_path(self):
+        """returns the path of the lock file of shared mode"""
+        return self.__file_path + ".lock"
+
+    def _lock_file(self):
+        """returns the descriptor of the lock file, opened by this process:
+        a descriptor inherited through fork() would share its locks with
+        the parent"""
+        if FileStorage.__lock_pid != os.getpid():
+            FileStorage.__lock_fd = os.open(self._lock_path(),
+                                            os.O_RDWR | os.O_CREAT, 0o644)
+            FileStorage.__lock_pid = os.getpid()
+        return self.__lock_fd
+
+    def _read_sequence(self):
+        """returns the number of writes made to the files in shared mode,
+        None otherwise"""
+        if not self.shared:
+            return None
+        data = os.pread(self._lock_file(), sequence.size, 0)
+        if len(data) < sequence.size:
+            return 0
+        return sequence.unpack(data)[0]
+
+    @contextmanager
+    def _file_lock(self):
+        """in shared mode, holds the lock file while the block writes and
+        first merges the changes other processes saved"""
+        if not self.shared:
+            yield
+            return
+        fd = self._lock_file()
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if self._read_sequence() != self.__sequence:
+                self._reload(True)
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _count_write(self):
+        """adds the write just made to the change sequence number, while
+        the lock file is held"""
+        if self.shared:
+            FileStorage.__sequence = self._read_sequence() + 1
+            os.pwrite(self._lock_file(), sequence.pack(self.__sequence), 0)
+
+    def _sync(self):
+        """in shared mode, merges the changes other processes saved since
+        the last load, which costs one read of the lock file otherwise"""
+        if self.shared and self._read_sequence() != self.__sequence:
+            with self.__write_lock:
+                if self._read_sequence() != self.__sequence:
+                    self._reload(True)
+
+    @staticmethod
+    def _stamp(path):
+        """returns the (mtime, size, inode) of path, None if it's missing"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _segment(self, key):
+        """returns the segment of the file layout key is stored in: None
+        for the JSON file, (<class name>, <shard>) in the sharded layout"""
+        if not self.sharded:
+            return None
+        return (key.split(".", 1)[0],
+                zlib.crc32(key.encode("utf-8")) % self.shards)
+
+    def _segment_path(self, segment):
+        """returns the path of the file of segment"""
+        extension = self.file_format.extension
+        if segment is None:
+            if extension == ".json":
+                return self.__file_path
+            return os.path.splitext(self.__file_path)[0] + extension
+        name, shard = segment
+        if self.shards > 1:
+            name = "{}.{}".format(name, shard)
+        return os.path.join(self.__file_path + ".d", name + extension)
+
+    def _segments(self):
+        """returns the segments of the loaded objects"""
+        if not self.sharded:
+            return [None]
+        return [(name, shard) for name in sorted(self.__loaded)
+                for shard in range(self.shards)]
+
+    def _segment_items(self, segment):
+        """returns the (<class name>.id, obj) pairs stored in segment, obj
+        being None for the objects not built yet in lazy mode"""
+        if segment is None:
+            items = list(self.__objects.items())
+            for keys in list(self.__pending.values()):
+                items.extend((key, None) for key in list(keys))
+            return items
+        items = list(self.__by_class.get(segment[0], {}).items())
+        items.extend((key, None) for key in
+                     list(self.__pending.get(segment[0], ())))
+        return [(key, obj) for key, obj in items
+                if self._segment(key) == segment]
+
+    def _materialize(self, key):
+        """builds the object of key from its encoded form if it was loaded but
+        not built yet in lazy mode"""
+        pending = self.__pending.get(key.split(".", 1)[0])
+        if not pending or key not in pending:
+            return
+        with self.__write_lock:
+            if key not in pending:
+                return
+            obj = self._build(self.file_format.decode(self._record(key)))
+            self.__objects[key] = obj
+            self._index(key, obj)
+            pending.discard(key)
+            if not self.keep_encoded:
+                self.__encoded.pop(key, None)
+
+    def _materialize_class(self, name):
+        """builds every object of the class name not built yet"""
+        for key in list(self.__pending.get(name, ())):
+            self._materialize(key)
+        for attr in foreign_keys.get(name, ()):
+            self.__pending_by_foreign_key.pop((name, attr), None)
+        self.__pending_indexed.discard(name)
+
+    def _materialize_related(self, name, foreign_key, value):
+        """builds the objects of the class name not built yet whose foreign
+        key has value, or all of them if foreign_key isn't indexed"""
+        if foreign_key not in foreign_keys.get(name, ()):
+            self._materialize_class(name)
+            return
+        if name not in self.__pending_indexed and self.__pending.get(name):
+            with self.__write_lock:
+                if name not in self.__pending_indexed:
+                    for key in list(self.__pending.get(name, ())):
+                        self._index_pending(key)
+                    self.__pending_indexed.add(name)
+        index = self.__pending_by_foreign_key.get((name, foreign_key), {})
+        for key in list(index.get(value, ())):
+            self._materialize(key)
+        with self.__write_lock:
+            keys = index.get(value)
+            if keys is not None:
+                keys.difference_update(
+                    [key for key in list(keys)
+                     if key not in self.__pending.get(name, ())])
+                if not keys:
+                    index.pop(value, None)
+
+    def _defer(self, key):
+        """marks the object of key as not built yet, indexing the values of
+        its foreign keys if its class was indexed already"""
+        name = key.split(".", 1)[0]
+        self.__pending.setdefault(name, set()).add(key)
+        if name in self.__pending_indexed:
+            self._index_pending(key)
+
+    def _index_pending(self, key):
+        """adds the object of key, not built yet, to the reverse foreign key
+        indexes of these objects, reading the values from its encoded form
+        without decoding the rest"""
+        name = key.split(".", 1)[0]
+        attrs = foreign_keys.get(name)
+        record = self._record(key)
+        if not attrs or record is None:
+            return
+        for attr, value in self.file_format.fields(record, attrs).items():
+            if value is not None:
+                self.__pending_by_foreign_key.setdefault(
+                    (name, attr), {}).setdefault(value, set()).add(key)
+
+    def _ensure_loaded(self, name):
+        """loads the files of the class name in the sharded layout, the
+        first time it's used"""
+        if not self.sharded or name in self.__loaded or name not in classes:
+            return
+        with self.__write_lock:
+            if name in self.__loaded:
+                return
+            self.__loaded.add(name)
+            paths = self._class_paths(name)
+            current = {self._segment_path((name, shard))
+                       for shard in range(self.shards)}
+            if (self._shard_counts().get(name, self.shards) != self.shards or
+                    not current.issuperset(paths)):
+                self._reshard(name, paths)
+                return
+            for shard in range(self.shards):
+                path = self._segment_path((name, shard))
+                stamp = self._stamp(path)
+                self._load_segment((name, shard))
+                self.__stamps[path] = stamp
+
+    def _class_paths(self, name):
+        """returns the files of the class name in the sharded layout, of
+        any number of shards"""
+        directory = self.__file_path + ".d"
+        try:
+            entries = os.listdir(directory)
+        except OSError:
+            return []
+        pattern = re.compile(re.escape(name) + r"(\.\d+)?" +
+                             re.escape(self.file_format.extension) + r"\Z")
+        return [os.path.join(directory, entry) for entry in sorted(entries)
+                if pattern.match(entry)]
+
+    def _shard_counts_path(self):
+        """returns the path of the file recording the number of shards the
+        files of each class were written with in the sharded layout"""
+        return os.path.join(self.__file_path + ".d", "shards.json")
+
+    def _shard_counts(self):
+        """returns {class name: number of shards of its files}, empty if no
+        file records it"""
+        try:
+            with open(self._shard_counts_path(), "rb") as f:
+                return json_codec.codec.loads(f.read())
+        except (IOError, ValueError):
+            return {}
+
+    def _record_shards(self, names):
+        """records that the files of the classes names were written with
+        HBNB_FILE_SHARDS shards"""
+        counts = self._shard_counts()
+        if all(counts.get(name) == self.shards for name in names):
+            return
+        counts.update(dict.fromkeys(names, self.shards))
+        write_atomic(self._shard_counts_path(),
+                     json_codec.codec.dumps(counts, sort_keys=True))
+
+    def _reshard(self, name, paths):
+        """moves the objects of the class name from its files paths,
+        written with another number of shards, to the files of
+        HBNB_FILE_SHARDS shards, and removes the others"""
+        segments = [(name, shard) for shard in range(self.shards)]
+        current = {self._segment_path(segment) for segment in segments}
+        with self._file_lock():
+            # the files of the current names last, should a re-shard cut
+            # short have left both
+            for path in sorted(paths, key=lambda path: path in current):
+                self._load_segment(None, path=path)
+            self._write(segments, set())
+            self._count_write()
+        for path in paths:
+            if path not in current:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                self.__stamps.pop(path, None)
+
+    def _load_all(self):
+        """loads the files of every class in the sharded layout"""
+        for name in classes:
+            self._ensure_loaded(name)
+
+    def _load(self, key, value):
+        """replaces the object under key by one built from its dictionary
+        value, or removes it if value is None"""
+        self._unindex(key)
+        self.__encoded.pop(key, None)
+        self.__changed.discard(key)
+        self.__pending.get(key.split(".", 1)[0], set()).discard(key)
+        if value is None:
+            self.__objects.pop(key, None)
+        else:
+            obj = self._build(value)
+            self.__objects[key] = obj
+            self._index(key, obj)
+
+    @staticmethod
+    def _build(value):
+        """returns the object of the dictionary value, with its id-like
+        strings interned"""
+        for field in interned.get(value["__class__"], ()):
+            item = value.get(field)
+            if type(item) is str:
+                value[field] = sys.intern(item)
+            elif type(item) is list:
+                value[field] = [sys.intern(i) if type(i) is str else i
+                                for i in item]
+        return classes[value["__class__"]](**value)
+
+    def _journal_path(self):
+        """returns the path of the journal of the JSON file"""
+        return self.__file_path + ".journal"
+
+    def _append_journal(self, changed):
+        """appends the objects of the changed keys to the journal, with a
+        None value for the deleted ones, and syncs it"""
+        lines = []
+        for key in changed:
+            obj = self.__objects.get(key)
+            record = {"key": key, "value": obj.to_dict() if obj else None}
+            lines.append(json_codec.codec.dumps(record) + "\n")
+            self.__encoded.pop(key, None)
+        data = "".join(lines).encode("utf-8")
+        if self.__journal_size is None:
+            for _ in self._journal_records():
+                pass
+        with open(self._journal_path(), 'ab') as f:
+            # drops a torn record left by an interrupted append, which
+            # would hide the records appended after it
+            size = min(self.__journal_size, f.tell())
+            f.truncate(size)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        FileStorage.__journal_size = size + len(data)
+        self.__stamps[self._journal_path()] = self._stamp(self._journal_path())
+
+    def _encode(self, key, obj, changed):
+        """returns the encoded form of obj, stored under key, in file_format,
+        reusing the one of the last save unless key is in changed"""
+        record = self._record(key)
+        if obj is None:
+            # loaded but not built yet, so unchanged
+            return record
+        if record is None or key in changed:
+            record = self.file_format.encode(key, obj.to_dict())
+            if not self._mapped() and self.keep_encoded:
+                # when mapped, the file already keeps it
+                self.__encoded[key] = record
+        return record
+
     def delete(self, obj=None):
         """delete obj from __objects if it's inside"""
         if obj is not None:
             key = obj.__class__.__name__ + '.' + obj.id
-            if key in self.__objects:
+            with self.__write_lock:
+                if key not in self.__objects:
+                    return
+                self._log_undo(key, None, None)
+                self._unindex(key)
                 del self.__objects[key]
-                self.save()
+                self.__changed.add(key)
+            self.save()
 
     def close(self):
-        """call reload() method for deserializing the JSON file to objects"""
+        """call reload() method for deserializing the JSON file to objects,
+        which only reads the files again if they changed since"""
         self.reload()
 
     def count(self, cls=None):
@@ -84,7 +1337,31 @@ class FileStorage:
         Returns:
             int: The number of objects in the storage.
         """
-        return len(self.all(cls))
+        self._sync()
+        if cls is None:
+            self._load_all()
+            return len(self.__objects) + sum(
+                len(keys) for keys in list(self.__pending.values()))
+        name = self._class_name(cls)
+        self._ensure_loaded(name)
+        if len(self.__objects) != FileStorage.__indexed:
+            self._rebuild_indexes()
+        return (len(self.__by_class.get(name, {})) +
+                len(self.__pending.get(name, ())))
+
+    def counts(self, *cls):
+        """
+        Returns the number of objects of several classes.
+
+        Args:
+            *cls: The classes, or class names, of the objects to count,
+            every class if none is given.
+
+        Returns:
+            dict: The number of objects by class name.
+        """
+        return {self._class_name(model): self.count(model)
+                for model in cls or classes}
 
     def get(self, cls=None, cls_id=None):
         """
@@ -100,5 +1377,198 @@ class FileStorage:
         if None in [cls, cls_id]:
             return None
 
-        key = "{}.{}".format(cls.__name__, cls_id)
+        self._sync()
+        self._ensure_loaded(self._class_name(cls))
+        key = "{}.{}".format(self._class_name(cls), cls_id)
+        self._materialize(key)
         return self.__objects.get(key)
+
+    def related(self, cls, foreign_key, value):
+        """
+        Retrieve the objects of a class whose foreign key has a value.
+
+        Args:
+            cls (type): The class, or class name, of the objects.
+            foreign_key (str): The foreign key attribute, e.g. 'state_id'.
+            value (str): The ID the foreign key must reference.
+
+        Returns:
+            dict: The matching objects by <class name>.id.
+        """
+        self._sync()
+        name = self._class_name(cls)
+        self._ensure_loaded(name)
+        # builds the matching objects not built yet, and brings the indexes
+        # up to date if __objects was changed directly
+        self._materialize_related(name, foreign_key, value)
+        if len(self.__objects) != FileStorage.__indexed:
+            self._rebuild_indexes()
+        index = self.__by_foreign_key.get((name, foreign_key))
+        if index is None:
+            return {key: obj for key, obj in self._partition(name).items()
+                    if getattr(obj, foreign_key, None) == value}
+        return dict(index.get(value, {}))
+
+    def sorted_by_name(self, cls, foreign_key=None, value=None):
+        """
+        Retrieve the objects of a class in order of name, from an index
+        kept up to date by each change.
+
+        Args:
+            cls (type): The class, or class name, of the objects, one of
+            the named classes.
+            foreign_key (str): Optional. A foreign key attribute, e.g.
+            'state_id', to only retrieve the objects referencing value.
+            value (str): Optional. The ID the foreign key must reference.
+
+        Returns:
+            list: The objects, ties being in order of id.
+        """
+        self._sync()
+        name = self._class_name(cls)
+        self._ensure_loaded(name)
+        # builds the objects loaded but not built yet and the indexes
+        if foreign_key is None:
+            self._materialize_class(name)
+        else:
+            self._materialize_related(name, foreign_key, value)
+        if len(self.__objects) != FileStorage.__indexed:
+            self._rebuild_indexes()
+        with self.__write_lock:
+            index = self.__by_name.get((name, foreign_key, value))
+            if index is None:
+                return []
+            return [entry[2] for entry in index.sorted()]
+
+    def changed(self, obj, name, old):
+        """marks obj as changed and updates the indexes after its attribute
+        name was changed from old"""
+        key = "{}.{}".format(obj.__class__.__name__, getattr(obj, "id", None))
+        if self.__objects.get(key) is not obj:
+            return
+        self._log_undo(key, (obj, old), name)
+        self.__changed.add(key)
+        class_name = obj.__class__.__name__
+        is_foreign_key = name in foreign_keys.get(class_name, ())
+        if not is_foreign_key and (name != "name" or class_name not in named):
+            return
+        with self.__write_lock:
+            if is_foreign_key:
+                index = self.__by_foreign_key[(class_name, name)]
+                index.get(old, {}).pop(key, None)
+                value = getattr(obj, name, None)
+                if value is not None:
+                    index.setdefault(value, {})[key] = obj
+            self._index_name(key, obj)
+
+    @staticmethod
+    def _class_name(cls):
+        """returns the class name of cls, which is a class or its name"""
+        if isinstance(cls, str):
+            return cls
+        return cls.__name__
+
+    def _partition(self, cls):
+        """returns the {<class name>.id: obj} partition of cls"""
+        self._ensure_loaded(self._class_name(cls))
+        self._materialize_class(self._class_name(cls))
+        if len(self.__objects) != FileStorage.__indexed:
+            # __objects was changed directly, e.g. through all().pop()
+            self._rebuild_indexes()
+        return self.__by_class.get(self._class_name(cls), {})
+
+    def _view(self, name):
+        """returns a snapshot of the partition of the class name, taken
+        again if it changed since; while another thread holds the write
+        lock, e.g. in the middle of a reload, the last snapshot is returned
+        instead unless this thread changed the objects since"""
+        view = self.__views.get(name)
+        if (view is not None and view[0] >= self.__versions.get(name, 0) and
+                len(self.__objects) == FileStorage.__indexed):
+            return view[1]
+        blocking = (view is None or
+                    getattr(self.__local, "version", 0) > view[0])
+        if not self.__write_lock.acquire(blocking=blocking):
+            return view[1]
+        try:
+            objects = dict(self._partition(name))
+            self.__views[name] = (FileStorage.__version, objects)
+            return objects
+        finally:
+            self.__write_lock.release()
+
+    def _changing(self, name):
+        """records a change of the partition of the class name, made while
+        holding the write lock"""
+        FileStorage.__version += 1
+        self.__versions[name] = FileStorage.__version
+        self.__local.version = FileStorage.__version
+
+    def _index(self, key, obj):
+        """adds obj, stored under key, to the per-class partitions"""
+        name = obj.__class__.__name__
+        self._changing(name)
+        if name not in self.__by_class:
+            self.__by_class[name] = {}
+        if key not in self.__by_class[name]:
+            FileStorage.__indexed += 1
+        self.__by_class[name][key] = obj
+        for attr in foreign_keys.get(name, ()):
+            index = self.__by_foreign_key.setdefault((name, attr), {})
+            value = getattr(obj, attr, None)
+            if value is not None:
+                index.setdefault(value, {})[key] = obj
+        self._index_name(key, obj)
+
+    def _index_name(self, key, obj):
+        """adds obj, stored under key, to the name indexes of its class,
+        replacing its previous entries"""
+        name = obj.__class__.__name__
+        if name not in named:
+            return
+        self._unindex_name(key)
+        entry = (_sort_key(obj, "name"), key, obj)
+        parents = tuple((attr, getattr(obj, attr, None))
+                        for attr in foreign_keys.get(name, ()))
+        self.__names[key] = (entry, parents)
+        for attr, value in ((None, None),) + parents:
+            if attr is None or value is not None:
+                self.__by_name.setdefault((name, attr, value),
+                                          SortedKeys()).add(entry)
+
+    def _unindex_name(self, key):
+        """removes the object stored under key from the name indexes"""
+        indexed = self.__names.pop(key, None)
+        if indexed is None:
+            return
+        entry, parents = indexed
+        name = key.split(".", 1)[0]
+        for attr, value in ((None, None),) + parents:
+            if attr is None or value is not None:
+                self.__by_name[(name, attr, value)].remove(entry)
+
+    def _unindex(self, key):
+        """removes the object stored under key from the partitions"""
+        obj = self.__objects.get(key)
+        if obj is not None:
+            name = obj.__class__.__name__
+            self._changing(name)
+            part = self.__by_class.get(name, {})
+            if part.pop(key, None) is not None:
+                FileStorage.__indexed -= 1
+            for attr in foreign_keys.get(name, ()):
+                index = self.__by_foreign_key.get((name, attr), {})
+                index.get(getattr(obj, attr, None), {}).pop(key, None)
+        self._unindex_name(key)
+
+    def _rebuild_indexes(self):
+        """rebuilds the per-class partitions from __objects"""
+        with self.__write_lock:
+            self.__views.clear()
+            self.__by_class.clear()
+            self.__by_foreign_key.clear()
+            self.__by_name.clear()
+            self.__names.clear()
+            FileStorage.__indexed = 0
+            for key, obj in list(self.__objects.items()):
+                self._index(key, obj)
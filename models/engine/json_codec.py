@@ -0,0 +1,137 @@
+#!/usr/bin/python3
+"""
+JSON encoders and decoders used by FileStorage and the API, the fastest one
+installed being the default (HBNB_JSON_CODEC: json or orjson)
+"""
+
+import json
+from os import getenv
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class StdlibCodec:
+    """the json module of the standard library"""
+
+    name = "json"
+
+    @staticmethod
+    def dumps(value, sort_keys=False, indent=None, default=None):
+        """returns the JSON text of value, compact unless indent is set"""
+        return json.dumps(value, sort_keys=sort_keys, indent=indent,
+                          separators=(",", ":") if indent is None
+                          else (",", ": "), default=default)
+
+    @staticmethod
+    def loads(text):
+        """returns the value of the JSON text or bytes"""
+        return json.loads(text)
+
+    @staticmethod
+    def record(value):
+        """returns the JSON text of the object dictionary value as it
+        appears in a file written by json.dump(objects, f, indent=4)"""
+        return json.dumps(value, indent=4).replace("\n", "\n    ")
+
+
+def _non_finite(value):
+    """returns True if value holds a NaN or infinite float"""
+    if type(value) is float:
+        return value != value or value in (float("inf"), float("-inf"))
+    if type(value) is dict:
+        return any(_non_finite(item) for item in value.values())
+    if type(value) in (list, tuple):
+        return any(_non_finite(item) for item in value)
+    return False
+
+
+def _past_64_bits(value):
+    """returns True if value holds a float outside the 64-bit integers, as
+    orjson reads the integers past them"""
+    if type(value) is dict:
+        items = value.values()
+    elif type(value) is list:
+        items = value
+    else:
+        items = (value,)
+    for item in items:
+        kind = type(item)
+        if kind is float:
+            if item >= 18446744073709551616.0 or \
+                    item < -9223372036854775808.0:
+                return True
+        elif (kind is dict or kind is list) and _past_64_bits(item):
+            return True
+    return False
+
+
+class OrjsonCodec:
+    """the orjson package, writing the same layouts as StdlibCodec except
+    for non-ASCII characters, which it doesn't escape; what orjson can't
+    write or read as the json module does, e.g. integers past 64 bits or
+    NaN, which it writes as null, goes through StdlibCodec"""
+
+    name = "orjson"
+
+    @staticmethod
+    def dumps(value, sort_keys=False, indent=None, default=None):
+        """returns the JSON text of value, compact unless indent is set"""
+        option = orjson.OPT_NON_STR_KEYS
+        if default is not None:
+            # dates go to default, as with the json module
+            option |= orjson.OPT_PASSTHROUGH_DATETIME
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent == 2:
+            option |= orjson.OPT_INDENT_2
+        elif indent is not None:
+            # the only indent orjson writes is 2
+            return StdlibCodec.dumps(value, sort_keys, indent, default)
+        try:
+            text = orjson.dumps(value, default=default, option=option)
+        except orjson.JSONEncodeError:
+            return StdlibCodec.dumps(value, sort_keys, indent, default)
+        if b"null" in text and _non_finite(value):
+            return StdlibCodec.dumps(value, sort_keys, indent, default)
+        return text.decode("utf-8")
+
+    @staticmethod
+    def loads(text):
+        """returns the value of the JSON text or bytes"""
+        try:
+            value = orjson.loads(text)
+        except orjson.JSONDecodeError:
+            # e.g. NaN, which the json module writes and reads
+            return json.loads(text)
+        if _past_64_bits(value):
+            # maybe an integer past 64 bits, which orjson reads as a float
+            return json.loads(text)
+        return value
+
+    @staticmethod
+    def record(value):
+        """returns the JSON text of the object dictionary value as it
+        appears in a file written by json.dump(objects, f, indent=4)"""
+        try:
+            text = orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS |
+                                orjson.OPT_INDENT_2)
+        except orjson.JSONEncodeError:
+            return StdlibCodec.record(value)
+        if b"null" in text and _non_finite(value):
+            return StdlibCodec.record(value)
+        text = text.decode("utf-8")
+        # from 2 to 4 spaces per level, plus the 4 of the file level
+        return "\n    ".join([
+            line[:len(line) - len(line.lstrip(" "))] + line
+            for line in text.split("\n")])
+
+
+codecs = {"json": StdlibCodec}
+if orjson is not None:
+    codecs["orjson"] = OrjsonCodec
+
+# the codec in use, orjson when it's installed
+codec = codecs.get(getenv("HBNB_JSON_CODEC", ""),
+                   OrjsonCodec if orjson is not None else StdlibCodec)
@@ -0,0 +1,203 @@
+#!/usr/bin/python3
+"""
+JSON file format for FileStorage: the {<class name>.id: <object
+dictionary>} map laid out as by json.dump(objects, f, indent=4), read one
+object at a time
+"""
+
+from functools import lru_cache
+import json
+import re
+from models.engine import json_codec
+
+# whitespace allowed between JSON tokens
+_whitespace = re.compile(r"[ \t\n\r]*")
+
+# characters read at a time when the file isn't laid out by json.dump
+_chunk_size = 1 << 16
+
+
+class JsonFormat:
+    """reads and writes FileStorage files in the JSON format"""
+
+    extension = ".json"
+
+    @staticmethod
+    def open(path):
+        """opens the file at path for reading"""
+        return open(path, 'r', encoding="utf-8")
+
+    @staticmethod
+    def encode(key, value):
+        """returns the JSON text of the object dictionary value stored
+        under key"""
+        return encode_value(value)
+
+    @staticmethod
+    def decode(text):
+        """returns the object dictionary of the JSON text"""
+        return json_codec.codec.loads(text)
+
+    @staticmethod
+    def fields(text, names):
+        """returns the {name: value} of the top-level scalar fields names of
+        the JSON text, without parsing the others"""
+        found = {}
+        for name, token in _fields_pattern(names).findall(text):
+            found[name] = json_codec.codec.loads(token)
+        return found
+
+    @staticmethod
+    def records(f):
+        """yields the objects of the JSON file f, see iter_records()"""
+        return iter_records(f)
+
+    @staticmethod
+    def dump(items):
+        """returns the content of a file holding the (<class name>.id, JSON
+        text) pairs items"""
+        if not items:
+            return "{}"
+        # same layout as json.dump(objects, f, indent=4)
+        lines = ["    {}: {}".format(json.dumps(key), text)
+                 for key, text in items]
+        return "{\n" + ",\n".join(lines) + "\n}"
+
+
+def encode_value(value):
+    """returns the JSON text of the dictionary value as it appears in a file
+    written by json.dump(objects, f, indent=4)"""
+    return json_codec.codec.record(value)
+
+
+@lru_cache(maxsize=None)
+def _fields_pattern(names):
+    """returns the pattern of the top-level scalar fields names of a JSON
+    text laid out by encode_value(): their lines are indented by 8
+    spaces"""
+    return re.compile(r'^ {8}"(' + "|".join(map(re.escape, names)) +
+                      r')": ("(?:[^"\\\n]|\\.)*"|[^"{\[\n,][^,\n]*)',
+                      re.MULTILINE)
+
+
+def iter_records(f):
+    """
+    Yields the objects of the JSON file f one at a time.
+
+    Args:
+        f (file): The JSON file, opened for reading text.
+
+    Yields:
+        tuple: (<class name>.id, JSON text, dictionary) for each object,
+        the JSON text being laid out as by encode_value() and the
+        dictionary being None when it wasn't parsed yet.
+    """
+    first = f.readline()
+    if first == "{\n":
+        try:
+            for record in _iter_indented_records(f):
+                yield record
+            return
+        except ValueError:
+            # not written by json.dump(indent=4): the records read again
+            # from the start are the same, so reading them twice is safe
+            pass
+    f.seek(0)
+    for key, value in _iter_any_records(f):
+        yield key, encode_value(value), value
+
+
+def _iter_indented_records(f):
+    """yields the records of f, laid out by json.dump(objects, f, indent=4)
+    and positioned after its first line, without parsing the objects:
+    their lines are indented deeper than 4 spaces"""
+    for line in f:
+        if line.rstrip("\n") == "}":
+            return
+        if not line.startswith('    "'):
+            raise ValueError("unexpected line: " + line)
+        key, separator, value = line[5:].partition('": ')
+        if not separator:
+            raise ValueError("unexpected line: " + line)
+        parts = [value]
+        if value.rstrip(",\n").endswith("{"):
+            for line in f:
+                if line.rstrip(",\n") == "    }":
+                    parts.append("    }")
+                    break
+                parts.append(line)
+            else:
+                raise ValueError("unexpected end of file")
+        else:
+            parts[0] = value.rstrip(",\n")
+        yield json.loads('"' + key + '"'), "".join(parts), None
+    raise ValueError("unexpected end of file")
+
+
+def _iter_any_records(f):
+    """yields the (<class name>.id, dictionary) pairs of a JSON object read
+    from f a chunk at a time, whatever its layout"""
+    decoder = json.JSONDecoder()
+    reader = _Reader(f)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.decode(decoder)
+        reader.expect(":")
+        value = reader.decode(decoder)
+        yield key, value
+        if reader.peek() == "}":
+            return
+        reader.expect(",")
+
+
+class _Reader:
+    """buffer over a text file for _iter_any_records"""
+
+    def __init__(self, f):
+        """initializes an empty buffer over f"""
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """drops the consumed text and appends the next chunk of f"""
+        data = self.f.read(_chunk_size)
+        self.eof = not data
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+
+    def peek(self):
+        """skips whitespace and returns the next character"""
+        while True:
+            self.pos = _whitespace.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                raise ValueError("unexpected end of file")
+            self.fill()
+
+    def expect(self, char):
+        """consumes the next character, which must be char"""
+        if self.peek() != char:
+            raise ValueError("expected " + char)
+        self.pos += 1
+
+    def decode(self, decoder):
+        """consumes and returns the next JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if self.eof:
+                    raise
+                self.fill()
+                continue
+            if end < len(self.buf) or self.eof:
+                self.pos = end
+                return value
+            # a number may continue in the next chunk
+            self.fill()
@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+"""
+Contains the Query class, the conditions, order and limit on the objects
+of a class returned by storage.query(), run by each storage its own way
+"""
+
+import operator
+
+# comparisons of the <attribute>__<operator> arguments of Query.filter()
+operators = {
+    "eq": operator.eq, "ne": operator.ne, "lt": operator.lt,
+    "lte": operator.le, "gt": operator.gt, "gte": operator.ge,
+    "in": lambda value, values: value in values,
+}
+
+
+class Query:
+    """conditions, order and limit on the objects of a class, built by
+    chaining filter(), order_by() and limit(), each returning a new query,
+    and run when its results are read"""
+
+    def __init__(self, cls):
+        """
+        Initializes the query of every object of cls.
+
+        Args:
+            cls (type): The class, or class name, of the objects.
+        """
+        self.cls = cls
+        # tuple - (attribute, operator name, value) of each condition
+        self.conditions = ()
+        # tuple - (attribute, True if descending) of each sort key
+        self.ordering = ()
+        # integer - maximum number of results, None for all of them
+        self.max_results = None
+
+    def _copy(self, **changes):
+        """returns a copy of the query with the attributes changes"""
+        query = self.__class__.__new__(self.__class__)
+        query.__dict__.update(self.__dict__)
+        query.__dict__.update(changes)
+        return query
+
+    def filter(self, **conditions):
+        """
+        Returns the query restricted to the objects matching conditions.
+
+        Args:
+            **conditions: <attribute>=value, or <attribute>__<operator>=
+            value with an operator among eq, ne, lt, lte, gt, gte and in,
+            e.g. city_id=..., price_by_night__lte=100.
+
+        Raises:
+            ValueError: If an operator is unknown.
+        """
+        added = []
+        for argument, value in conditions.items():
+            name, separator, op = argument.rpartition("__")
+            if not separator:
+                name, op = argument, "eq"
+            elif op not in operators:
+                raise ValueError("unknown operator in " + argument)
+            added.append((name, op, value))
+        return self._copy(conditions=self.conditions + tuple(added))
+
+    def order_by(self, *names):
+        """returns the query sorting the objects by the attributes names,
+        in descending order for the ones starting with '-'"""
+        return self._copy(ordering=self.ordering + tuple(
+            (name.lstrip("-"), name.startswith("-")) for name in names))
+
+    def limit(self, count):
+        """returns the query returning at most count objects"""
+        return self._copy(max_results=count)
+
+    def all(self):
+        """returns the list of the objects of the query"""
+        return self._results()
+
+    def first(self):
+        """returns the first object of the query, or None"""
+        results = self.limit(1).all()
+        return results[0] if results else None
+
+    def count(self):
+        """returns the number of objects of the query"""
+        return len(self._results())
+
+    def __iter__(self):
+        """iterates over the objects of the query"""
+        return iter(self.all())
+
+    def _results(self):
+        """runs the query and returns the list of its objects"""
+        raise NotImplementedError
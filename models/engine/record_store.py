@@ -0,0 +1,103 @@
+#!/usr/bin/python3
+"""
+Memory-mapped binary storage file: only the offset of each record is kept
+in memory, a record being read from the map when its object is needed
+"""
+
+import mmap
+import os
+import struct
+from models.engine.binary_records import HEADER, record_key
+
+_length = struct.Struct("<I")
+
+
+class RecordStore:
+    """read-only memory map of a file in the binary format, with the
+    location of the current record of each key, and appends to its end"""
+
+    def __init__(self, path):
+        """
+        Maps the file at path and indexes its records.
+
+        Args:
+            path (str): The path of the file, which must exist.
+
+        Raises:
+            IOError: If the file can't be opened.
+            ValueError: If the file isn't in the binary format.
+        """
+        self.path = path
+        # dictionary - (offset, length) of the current record of each key
+        self.index = {}
+        # integer - bytes taken by records replaced or deleted since
+        self.garbage = 0
+        # integer - offset of the end of the last complete record
+        self.size = len(HEADER)
+        self.map = None
+        self._remap()
+        if self.map is None or self.map[:len(HEADER)] != HEADER:
+            self.close()
+            raise ValueError("not a binary storage file")
+        self._scan(len(HEADER))
+
+    def _remap(self):
+        """maps the whole file again, e.g. after an append"""
+        with open(self.path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            new = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) \
+                if size else None
+        if self.map is not None:
+            self.map.close()
+        self.map = new
+
+    def _scan(self, pos):
+        """indexes the records from pos to the end of the map, stopping at
+        a record torn by an interrupted append"""
+        data = self.map
+        end_of_file = len(data)
+        while pos + _length.size <= end_of_file:
+            length = _length.unpack_from(data, pos)[0]
+            start = pos + _length.size
+            if start + length > end_of_file:
+                break
+            key, deleted = record_key(data, start, start + length)
+            previous = self.index.pop(key, None)
+            if previous is not None:
+                self.garbage += _length.size + previous[1]
+            if deleted:
+                self.garbage += _length.size + length
+            else:
+                self.index[key] = (start, length)
+            pos = start + length
+        self.size = pos
+
+    def read(self, key):
+        """returns the current record of key"""
+        offset, length = self.index[key]
+        return self.map[offset:offset + length]
+
+    def append(self, records):
+        """
+        Appends records to the file, syncs it and indexes them.
+
+        Args:
+            records (list): Records encoded by BinaryFormat.encode().
+        """
+        data = b"".join(_length.pack(len(record)) + record
+                        for record in records)
+        with open(self.path, 'r+b') as f:
+            # drops a torn record left by an interrupted append
+            f.truncate(self.size)
+            f.seek(self.size)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self._remap()
+        self._scan(self.size)
+
+    def close(self):
+        """unmaps the file"""
+        if self.map is not None:
+            self.map.close()
+            self.map = None
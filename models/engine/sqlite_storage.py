@@ -0,0 +1,42 @@
+#!/usr/bin/python3
+"""
+Contains the class SQLiteStorage
+"""
+
+import os
+from os import getenv
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
+from models import FILE_PATH
+from models.engine.db_storage import DBStorage
+
+# string - default path of the database file, next to the JSON file
+DB_PATH = os.path.splitext(FILE_PATH)[0] + ".db"
+
+
+def set_pragmas(dbapi_connection, connection_record):
+    """turns on the write-ahead log and the foreign key checks of each new
+    SQLite connection"""
+    cursor = dbapi_connection.cursor()
+    # readers don't block the writer and a commit appends to the log
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # in WAL mode a commit survives a crash of the process, syncing at
+    # checkpoints only
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+class SQLiteStorage(DBStorage):
+    """interacts with a SQLite database file, through the same models and
+    sessions as DBStorage"""
+
+    def _create_engine(self):
+        """returns the engine of the SQLite database file (path:
+        HBNB_SQLITE_DB)"""
+        engine = create_engine(
+            'sqlite:///{}'.format(getenv('HBNB_SQLITE_DB', DB_PATH)),
+            connect_args={"check_same_thread": False},
+            poolclass=QueuePool)
+        event.listen(engine, "connect", set_pragmas)
+        return engine
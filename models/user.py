@@ -30,6 +30,21 @@ class User(BaseModel, Base):
         """initializes user"""
         super().__init__(*args, **kwargs)
 
+    if models.storage_t != 'db':
+        @property
+        def places(self):
+            """getter for list of place instances owned by the user"""
+            from models.place import Place
+            return list(models.storage.related(Place, "user_id",
+                                               self.id).values())
+
+        @property
+        def reviews(self):
+            """getter for list of review instances written by the user"""
+            from models.review import Review
+            return list(models.storage.related(Review, "user_id",
+                                               self.id).values())
+
     def __setattr__(self, name, value):
         """sets password"""
         if name == 'password':
@@ -247,4 +247,6 @@ if __name__ == "__main__":
         print("Usage: {} <number_of_instance>".format(sys.argv[0]))
         sys.exit(1)
 
-    create_dummy_data(int(sys.argv[1]))
+    # one write, or commit, for all the objects
+    with storage.batch():
+        create_dummy_data(int(sys.argv[1]))
@@ -158,3 +158,146 @@ class TestBaseModel(unittest.TestCase):
         self.assertEqual(old_created_at, new_created_at)
         self.assertTrue(mock_storage.new.called)
         self.assertTrue(mock_storage.save.called)
+
+
+@unittest.skipIf(models.storage_t == "db", "to_dict() built on each call")
+class TestBaseModelCachedDict(unittest.TestCase):
+    """Test the dictionary kept by to_dict() in file storage mode"""
+
+    def test_to_dict_built_once(self):
+        """Test that to_dict() reuses its dictionary until a change"""
+        inst = BaseModel()
+        with mock.patch.object(BaseModel, "_build_dict",
+                               wraps=inst._build_dict) as build:
+            first = inst.to_dict()
+            first["name"] = "Not kept"
+            self.assertNotIn("name", inst.to_dict())
+            self.assertEqual(build.call_count, 1)
+            inst.name = "Kept"
+            self.assertEqual(inst.to_dict()["name"], "Kept")
+            del inst.name
+            self.assertNotIn("name", inst.to_dict())
+            self.assertEqual(build.call_count, 3)
+
+    @mock.patch('models.storage')
+    def test_save_drops_dictionary(self, mock_storage):
+        """Test that save() makes to_dict() return the new updated_at"""
+        inst = BaseModel()
+        before = inst.to_dict()
+        inst.updated_at = datetime(2017, 9, 28)
+        inst.save()
+        self.assertNotEqual(inst.to_dict()["updated_at"],
+                            before["updated_at"])
+
+
+class TestTimeCodec(unittest.TestCase):
+    """Test the date parsing and formatting of BaseModel"""
+
+    def test_parse_time(self):
+        """Test that parse_time reads what strptime reads"""
+        t_format = "%Y-%m-%dT%H:%M:%S.%f"
+        for string in ["2017-09-28T21:05:54.119427",
+                       "2017-09-28T21:05:54.1", "0999-01-01T00:00:00.000000"]:
+            with self.subTest(string=string):
+                self.assertEqual(models.base_model.parse_time(string),
+                                 datetime.strptime(string, t_format))
+        for string in ["2017-13-28T21:05:54.119427", "2017-09-28 21:05:54"]:
+            with self.subTest(string=string):
+                with self.assertRaises(ValueError):
+                    models.base_model.parse_time(string)
+
+    def test_format_time(self):
+        """Test that format_time writes what strftime writes"""
+        t_format = "%Y-%m-%dT%H:%M:%S.%f"
+        for moment in [datetime(2017, 9, 28, 21, 5, 54, 119427),
+                       datetime(2017, 9, 28), datetime.utcnow()]:
+            with self.subTest(moment=moment):
+                self.assertEqual(models.base_model.format_time(moment),
+                                 moment.strftime(t_format))
+
+
+@unittest.skipUnless(models.base_model.lazy_dates, "dates parsed eagerly")
+class TestBaseModelLazyDates(unittest.TestCase):
+    """Test the dates left to parse of HBNB_LAZY_DATES"""
+
+    def test_date_parsed_on_read(self):
+        """Test that a loaded date stays a string until it's read"""
+        string = "2017-09-28T21:05:54.119427"
+        inst = BaseModel(id="1", created_at=string, updated_at=string)
+        self.assertEqual(inst.to_dict()["created_at"], string)
+        self.assertEqual(inst.created_at,
+                         datetime(2017, 9, 28, 21, 5, 54, 119427))
+        self.assertEqual(inst.to_dict()["created_at"], string)
+        self.assertEqual(inst.to_dict()["updated_at"], string)
+
+    def test_str_shows_parsed_dates(self):
+        """Test that __str__ shows the dates not read yet as datetimes"""
+        string = "2017-09-28T21:05:54.119427"
+        inst = BaseModel(id="1", created_at=string, updated_at=string)
+        eager = BaseModel(id="1")
+        eager.created_at = eager.updated_at = datetime(
+            2017, 9, 28, 21, 5, 54, 119427)
+        self.assertEqual(str(inst), str(eager))
+        self.assertNotIn(string, str(inst))
+        inst.created_at
+        self.assertEqual(str(inst), str(eager))
+
+    def test_invalid_date_parsed_at_once(self):
+        """Test that a date in another format is still checked when the
+        instance is built"""
+        with self.assertRaises(ValueError):
+            BaseModel(id="1", created_at="2017-09-28 21:05:54")
+
+
+@unittest.skipUnless(models.base_model.compact, "not in compact mode")
+class TestBaseModelCompact(unittest.TestCase):
+    """Test the compact instances of HBNB_FILE_COMPACT"""
+
+    def test_no_instance_dictionary(self):
+        """Test that the attributes are kept in slots and the dates as
+        integers"""
+        from models.place import Place
+        place = Place(name="Loft")
+        self.assertFalse(hasattr(place, "__weakref__"))
+        self.assertIn("name", Place.__slots__)
+        self.assertIs(type(place._created_at), int)
+        self.assertIs(type(place.created_at), datetime)
+
+    def test_dictionary_view(self):
+        """Test that __dict__ holds the attributes set, extra ones
+        included, but not the defaults"""
+        from models.place import Place
+        place = Place(name="Loft")
+        place.motto = "Home"
+        self.assertEqual(place.number_rooms, 0)
+        self.assertEqual(place.motto, "Home")
+        self.assertEqual(set(place.__dict__), {"id", "created_at",
+                                               "updated_at", "name",
+                                               "motto"})
+        del place.motto
+        self.assertFalse(hasattr(place, "motto"))
+
+    def test_dictionary_order(self):
+        """Test that __dict__, to_dict() and str() list the attributes in
+        order of assignment, as a regular instance dictionary does"""
+        from models.place import Place
+        place = Place(name="Loft", motto="Home", city_id="1")
+        place.number_rooms = 2
+        order = ["name", "motto", "city_id", "created_at", "updated_at",
+                 "id", "number_rooms"]
+        self.assertEqual(list(place.__dict__), order)
+        self.assertEqual(list(place.to_dict()), order + ["__class__"])
+        self.assertLess(str(place).index("'motto'"),
+                        str(place).index("'city_id'"))
+        del place.motto
+        place.motto = "Away"
+        self.assertEqual(list(place.__dict__)[-1], "motto")
+
+    def test_reload_from_dictionary(self):
+        """Test that an instance built from to_dict() is equal to its
+        source"""
+        from models.review import Review
+        review = Review(text="Great", place_id="1", user_id="2")
+        copy = Review(**review.to_dict())
+        self.assertEqual(copy.to_dict(), review.to_dict())
+        self.assertEqual(copy.created_at, review.created_at)
@@ -0,0 +1,177 @@
+#!/usr/bin/python3
+"""
+Contains the TestBinaryRecordsDocs and TestBinaryRecords classes
+"""
+
+import inspect
+import io
+import json
+import os
+import unittest
+from unittest import mock
+import pep8
+import models
+from models import FILE_PATH
+from models.engine import binary_records
+from models.engine.binary_records import BinaryFormat
+from models.engine.file_storage import FileStorage
+from models.state import State
+import lazy_methods
+import convert_storage
+
+
+class TestBinaryRecordsDocs(unittest.TestCase):
+    """Tests to check the documentation and style of binary_records"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up for the doc tests"""
+        cls.br_f = inspect.getmembers(binary_records, inspect.isfunction)
+
+    def test_pep8_conformance_binary_records(self):
+        """Test that models/engine/binary_records.py conforms to pep8."""
+        pep8s = pep8.StyleGuide(quiet=True)
+        result = pep8s.check_files(["models/engine/binary_records.py",
+                                    "convert_storage.py",
+                                    "benchmark_storage.py",
+                                    "tests/test_models/test_engine/"
+                                    "test_binary_records.py"])
+        self.assertEqual(
+            result.total_errors, 0, "Found code style errors (and warnings)."
+        )
+
+    def test_binary_records_module_docstring(self):
+        """Test for the binary_records.py module docstring"""
+        self.assertIsNot(binary_records.__doc__, None,
+                         "binary_records.py needs a docstring")
+        self.assertTrue(len(binary_records.__doc__) >= 1,
+                        "binary_records.py needs a docstring")
+
+    def test_binary_records_func_docstrings(self):
+        """Test for the presence of docstrings in binary_records functions"""
+        for func in self.br_f:
+            self.assertIsNot(func[1].__doc__, None,
+                             "{} function needs a docstring".format(func[0]))
+            self.assertTrue(len(func[1].__doc__) >= 1,
+                            "{} function needs a docstring".format(func[0]))
+
+
+class TestBinaryRecords(unittest.TestCase):
+    """Test the binary file format"""
+
+    objects = {
+        "Place.{}".format(i): {
+            "__class__": "Place",
+            "id": str(i),
+            "created_at": "2017-09-28T21:03:54.05{:04d}".format(i),
+            "updated_at": "1969-12-31T23:59:59.999999",
+            "name": "Pläce \"{}\"".format(i),
+            "number_rooms": i - 5,
+            "latitude": 0.1 * i,
+            "amenity_ids": ["a", "Place", str(i), None, True, False],
+            "unknown_field": {"nested": [{"deep": 2 ** 70}]},
+            "not_a_time": "2017-13-28T21:03:54.050000",
+        } for i in range(10)
+    }
+
+    def dump(self, objects):
+        """returns the binary file content holding objects"""
+        return BinaryFormat.dump([(key, BinaryFormat.encode(key, value))
+                                  for key, value in objects.items()])
+
+    def read(self, content):
+        """returns the objects of the binary file content"""
+        return {key: BinaryFormat.decode(record) for key, record, _ in
+                BinaryFormat.records(io.BytesIO(content))}
+
+    def test_roundtrip(self):
+        """Test that every JSON value reads back unchanged."""
+        self.assertEqual(self.read(self.dump(self.objects)), self.objects)
+
+    def test_fields(self):
+        """Test that fields reads the values asked for, past values of
+        every kind, and leaves out the missing ones."""
+        names = ("number_rooms", "not_a_time", "city_id")
+        for key, value in self.objects.items():
+            record = BinaryFormat.encode(key, value)
+            self.assertEqual(BinaryFormat.fields(record, names),
+                             {"number_rooms": value["number_rooms"],
+                              "not_a_time": value["not_a_time"]})
+            self.assertEqual(BinaryFormat.fields(record, ("id",)),
+                             {"id": value["id"]})
+
+    def test_smaller_than_json(self):
+        """Test that model objects take less room than in JSON."""
+        self.assertLess(len(self.dump(self.objects)),
+                        len(json.dumps(self.objects).encode("utf-8")) / 2)
+
+    def test_empty_file(self):
+        """Test a file holding no object."""
+        self.assertEqual(self.read(self.dump({})), {})
+
+    def test_bad_files(self):
+        """Test that truncated or foreign files raise ValueError."""
+        content = self.dump(self.objects)
+        with self.assertRaises(ValueError):
+            self.read(content[:-3])
+        with self.assertRaises(ValueError):
+            self.read(b"{}")
+
+    def test_unserializable_value(self):
+        """Test that values JSON can't hold raise TypeError."""
+        with self.assertRaises(TypeError):
+            BinaryFormat.encode("State.1", {"id": "1", "value": object()})
+
+
+@unittest.skipIf(models.storage_t == "db", "file storage")
+class TestBinaryFileStorage(unittest.TestCase):
+    """Test FileStorage in the binary format"""
+
+    path = os.path.splitext(FILE_PATH)[0] + BinaryFormat.extension
+    value = {"__class__": "State", "id": "1", "name": "Nevada",
+             "created_at": "2017-09-28T21:03:54.052298",
+             "updated_at": "2017-09-28T21:03:54.052302"}
+
+    def setUp(self):
+        """empties the storage, so no object keeps a JSON encoding"""
+        lazy_methods.empty_object_dictionary(models.storage.all())
+        models.storage.compact()
+
+    def tearDown(self):
+        """removes the binary and converted files"""
+        for path in (self.path, self.path + ".json"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def dump(self):
+        """returns the binary file content holding a state"""
+        return BinaryFormat.dump([("State.1",
+                                   BinaryFormat.encode("State.1",
+                                                       self.value))])
+
+    def test_save_reload(self):
+        """Test that saved objects reload from the binary file."""
+        with mock.patch.object(FileStorage, "file_format", BinaryFormat):
+            state = State(name="California")
+            models.storage.new(state)
+            models.storage.save()
+            with open(self.path, "rb") as f:
+                self.assertEqual(f.read(len(binary_records.HEADER)),
+                                 binary_records.HEADER)
+            lazy_methods.empty_object_dictionary(models.storage.all())
+            models.storage.reload()
+            loaded = models.storage.get(State, state.id)
+        self.assertEqual(loaded.to_dict(), state.to_dict())
+
+    def test_convert(self):
+        """Test converting a binary file to JSON and back."""
+        with open(self.path, "wb") as f:
+            f.write(self.dump())
+        json_path = self.path + ".json"
+        self.assertEqual(convert_storage.convert(self.path, json_path), 1)
+        with open(json_path, "r", encoding="utf-8") as f:
+            self.assertEqual(json.load(f), {"State.1": self.value})
+        os.remove(self.path)
+        convert_storage.convert(json_path, self.path)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), self.dump())
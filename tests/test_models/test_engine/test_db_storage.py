@@ -3,10 +3,13 @@
 Contains the TestDBStorageDocs and TestDBStorage classes
 """
 
-from os import getenv
+from contextlib import contextmanager
 import inspect
 import unittest
+from unittest import mock
 import pep8
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 import models
 import models.base_model
 from models.engine import db_storage
@@ -28,6 +31,20 @@ classes = {
 }
 
 
+@contextmanager
+def recorded_statements():
+    """yields the list of the SQL statements run in the block"""
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(Engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, "before_cursor_execute", record)
+
+
 class TestDBStorageDocs(unittest.TestCase):
     """Tests to check the documentation and style of DBStorage class"""
 
@@ -102,7 +119,7 @@ class TestFileStorage(unittest.TestCase):
         """Test that save properly saves objects to file.json"""
 
 
-@unittest.skipUnless(getenv('HBNB_TYPE_STORAGE') == "db", "testing DBStorage")
+@unittest.skipUnless(models.storage_t == "db", "testing DBStorage")
 class TestDBStorage(unittest.TestCase):
     """Tests the DBStorage."""
 
@@ -130,6 +147,63 @@ class TestDBStorage(unittest.TestCase):
 
         self.assertEqual(models.storage.count(State), 2)
 
+    def test_counts(self):
+        """Test that `counts` counts several tables in one statement,
+        without loading their rows."""
+        state = State(name="Ohio")
+        state.save()
+        City(name="Akron", state_id=state.id).save()
+        City(name="Dayton", state_id=state.id).save()
+        with recorded_statements() as statements, \
+                mock.patch.object(DBStorage, "all") as load:
+            counts = models.storage.counts("City", State, User)
+            self.assertFalse(load.called)
+        self.assertEqual(counts, {"City": 2, "State": 1, "User": 0})
+        self.assertEqual(len(statements), 1)
+        self.assertIn("count(*)", statements[0])
+        self.assertEqual(models.storage.count(), 3)
+        self.assertEqual(models.storage.count("BaseModel"), 0)
+
+    def test_get_from_identity_map(self):
+        """Test that `get` returns the object of the session without a
+        query."""
+        state = State(name="Ohio")
+        state.save()
+        with recorded_statements() as statements:
+            self.assertIs(models.storage.get("State", state.id), state)
+        self.assertEqual(statements, [])
+        self.assertIsNone(models.storage.get("BaseModel", state.id))
+        self.assertGreater(
+            models.storage.cache_stats()["identity_map"]["hits"], 0)
+
+    def test_get_from_row_cache(self):
+        """Test that `get` reads the rows of the cached classes from the
+        row cache across sessions, until they change or expire."""
+        cache = db_storage.RowCache(10, 60)
+        with mock.patch.object(DBStorage, "row_cache", cache):
+            state = State(name="Ohio")
+            state.save()
+            City(name="Akron", state_id=state.id).save()
+            models.storage.close()
+            self.assertEqual(models.storage.get(State, state.id).name, "Ohio")
+            models.storage.close()
+            with recorded_statements() as statements:
+                state = models.storage.get(State, state.id)
+            self.assertEqual(statements, [])
+            self.assertEqual(state.name, "Ohio")
+            self.assertEqual([c.name for c in state.cities], ["Akron"])
+            self.assertEqual(cache.stats()["hits"], 1)
+            self.assertEqual(cache.stats()["ratio"], 0.5)
+            state.name = "Iowa"
+            state.save()
+            models.storage.close()
+            cache.ttl = 0
+            self.assertEqual(models.storage.get(State, state.id).name, "Iowa")
+            models.storage.close()
+            models.storage.get(State, state.id)
+            self.assertEqual(cache.stats()["hits"], 1)
+            self.assertEqual(cache.stats()["misses"], 3)
+
     def test_get_with_non_existent(self):
         """Test that `get` method returns None for non-existent objects."""
         self.assertIsNone(models.storage.get(User, 'abcd-1234-test-5678'))
@@ -152,3 +226,53 @@ class TestDBStorage(unittest.TestCase):
         city.save()
         self.assertEqual(models.storage.get(
             City, city.id), city)
+
+    def test_batch_commits_once(self):
+        """Test that the saves of a batch block make one commit."""
+        session = models.storage._DBStorage__session
+        with mock.patch.object(session, "commit",
+                               wraps=session.commit) as commit:
+            with models.storage.batch():
+                State(name="Ohio").save()
+                State(name="Utah").save()
+                self.assertEqual(commit.call_count, 0)
+            self.assertEqual(commit.call_count, 1)
+        models.storage.close()
+        self.assertEqual(models.storage.count(State), 2)
+
+    def test_batch_rollback(self):
+        """Test that a batch block raising commits nothing."""
+        with self.assertRaises(ValueError):
+            with models.storage.batch():
+                State(name="Iowa").save()
+                raise ValueError("abort")
+        self.assertEqual(models.storage.count(State), 0)
+
+    def test_query(self):
+        """Test that a query filters, orders and limits in SQL."""
+        state = State(name="Ohio")
+        state.save()
+        city = City(name="Akron", state_id=state.id)
+        city.save()
+        other = City(name="Dayton", state_id=state.id)
+        other.save()
+        user = User(email="a@b.c", password="pwd")
+        user.save()
+        for name, price, place_city in [("d", 50, city), ("a", 150, city),
+                                        ("c", 100, city), ("b", 80, city),
+                                        ("e", 10, other)]:
+            Place(name=name, price_by_night=price, city_id=place_city.id,
+                  user_id=user.id).save()
+        query = models.storage.query(Place).filter(
+            city_id=city.id, price_by_night__lte=100).order_by("name")
+        self.assertEqual([p.name for p in query], ["b", "c", "d"])
+        self.assertEqual([p.name for p in query.limit(2)], ["b", "c"])
+        self.assertEqual(query.order_by("-price_by_night").first().name,
+                         "b")
+        self.assertEqual(query.count(), 3)
+        self.assertEqual([p.name for p in models.storage.query("Place")
+                          .filter(name__in=["a", "e"]).order_by("-name")],
+                         ["e", "a"])
+        sql = str(query.limit(2)._statement())
+        for clause in ["WHERE", "ORDER BY", "LIMIT"]:
+            self.assertIn(clause, sql)
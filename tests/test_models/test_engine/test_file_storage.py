@@ -5,12 +5,19 @@ Contains the TestFileStorageDocs classes
 
 import inspect
 import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
 import unittest
+from unittest import mock
 from random import choice
 import pep8
 import models
 from models import FILE_PATH
 from models.engine import file_storage
+from models.engine.binary_records import BinaryFormat
 from models.amenity import Amenity
 from models.base_model import BaseModel
 from models.city import City
@@ -33,6 +40,74 @@ classes = {
 }
 
 
+def check_related_builds_matches(test):
+    """checks that, once reloaded without building the objects, reading
+    the cities of a state builds only these cities"""
+    states = [State(name=str(i)) for i in range(2)]
+    cities = [City(name=str(i), state_id=states[i % 2].id)
+              for i in range(4)]
+    for obj in states + cities:
+        models.storage.new(obj)
+    models.storage.save()
+    lazy_methods.empty_object_dictionary(FileStorage._FileStorage__objects)
+    with mock.patch.object(FileStorage, "_FileStorage__stamps", {}), \
+            mock.patch.object(City, "__init__", autospec=True,
+                              side_effect=City.__init__) as init:
+        models.storage.reload()
+        state = models.storage.get(State, states[0].id)
+        test.assertEqual(sorted(city.name for city in state.cities),
+                         ["0", "2"])
+        test.assertEqual(init.call_count, 2)
+        test.assertEqual(
+            [city.name for city in models.storage.sorted_by_name(
+                City, "state_id", states[1].id)], ["1", "3"])
+        test.assertEqual(init.call_count, 4)
+        models.storage.get(City, cities[1].id).state_id = states[0].id
+        test.assertEqual(len(state.cities), 3)
+        test.assertEqual(init.call_count, 4)
+
+
+def check_batch_isolation(test):
+    """checks that a save made by another thread while a batch block is
+    open writes none of its changes, so that none is left in the files
+    once the block raised"""
+    kept = State(name="Kept")
+    kept.save()
+    gone = State(name="Gone")
+    gone.save()
+    models.storage.flush()
+    opened = threading.Event()
+    saved = threading.Event()
+
+    def abort():
+        """changes objects in a batch that raises after the other save"""
+        try:
+            with models.storage.batch():
+                State(name="New").save()
+                kept.name = "Renamed"
+                kept.save()
+                gone.delete()
+                opened.set()
+                saved.wait(10)
+                raise ValueError("abort")
+        except ValueError:
+            pass
+    thread = threading.Thread(target=abort)
+    thread.start()
+    opened.wait(10)
+    State(name="Other").save()
+    # writes it in write-behind mode
+    models.storage.flush()
+    saved.set()
+    thread.join()
+    lazy_methods.empty_object_dictionary(FileStorage._FileStorage__objects)
+    with mock.patch.object(FileStorage, "_FileStorage__stamps", {}):
+        models.storage.reload()
+    test.assertEqual(sorted(state.name for state in
+                            models.storage.all(State).values()),
+                     ["Gone", "Kept", "Other"])
+
+
 class TestFileStorageDocs(unittest.TestCase):
     """Tests to check the documentation and style of FileStorage class"""
 
@@ -161,6 +236,15 @@ class TestFileStorage(unittest.TestCase):
                 self.assertEqual(models.storage.count(
                     instance_obj.__class__.__name__), num_of_instances)
 
+    def test_counts(self):
+        """Test that `counts` returns the number of objects of each class
+        given, or of every class."""
+        for model in [State, State, City]:
+            models.storage.new(model())
+        self.assertEqual(models.storage.counts(State, "City", User),
+                         {"State": 2, "City": 1, "User": 0})
+        self.assertEqual(sum(models.storage.counts().values()), 3)
+
     def test_get_with_non_existent(self):
         """Test that `get` method returns None for non-existent objects."""
         self.assertIsNone(models.storage.get(User, 'abcd-1234-test-5678'))
@@ -179,3 +263,913 @@ class TestFileStorage(unittest.TestCase):
 
                 self.assertEqual(models.storage.get(
                     instance, instance_obj.id), instance_obj)
+
+    def test_all_with_class_only_returns_that_class(self):
+        """Test that `all` with a class returns only objects of that class,
+        whether the class or its name is passed."""
+        for value in classes.values():
+            models.storage.new(value())
+        state = State()
+        models.storage.new(state)
+        key = "State." + state.id
+        self.assertEqual(len(models.storage.all(State)), 2)
+        self.assertIn(key, models.storage.all("State"))
+        for obj in models.storage.all(City).values():
+            self.assertIs(type(obj), City)
+
+    def test_class_index_follows_direct_removal(self):
+        """Test that removing a key from `all()` directly, as the console
+        does, also removes it from the class scoped views."""
+        state = State()
+        models.storage.new(state)
+        models.storage.all().pop("State." + state.id)
+        self.assertEqual(models.storage.count(State), 0)
+        self.assertEqual(models.storage.all(State), {})
+        self.assertIsNone(models.storage.get(State, state.id))
+
+    def test_related_follows_foreign_key_changes(self):
+        """Test that `related` and the relationship properties reflect
+        creation, foreign key updates and deletion of objects."""
+        state_1 = State(name="California")
+        state_2 = State(name="Nevada")
+        city = City(name="Fresno", state_id=state_1.id)
+        for obj in [state_1, state_2, city]:
+            models.storage.new(obj)
+        self.assertEqual(state_1.cities, [city])
+        self.assertEqual(
+            models.storage.related(City, "state_id", state_1.id),
+            {"City." + city.id: city})
+        city.state_id = state_2.id
+        self.assertEqual(state_1.cities, [])
+        self.assertEqual(state_2.cities, [city])
+        models.storage.delete(city)
+        self.assertEqual(state_2.cities, [])
+
+    def test_related_after_reload(self):
+        """Test that the reverse indexes are rebuilt by `reload`."""
+        place = Place(name="Loft")
+        review = Review(place_id=place.id, text="Great")
+        models.storage.new(place)
+        models.storage.new(review)
+        models.storage.save()
+        lazy_methods.empty_object_dictionary(models.storage.all())
+        models.storage.reload()
+        place = models.storage.get(Place, place.id)
+        self.assertEqual([r.id for r in place.reviews], [review.id])
+
+    def test_building_skips_changed(self):
+        """Test that creating or loading objects doesn't go through
+        `changed`, and that setting an attribute afterwards does."""
+        state = State(name="Ohio")
+        state.save()
+        lazy_methods.empty_object_dictionary(models.storage.all())
+        with mock.patch.object(FileStorage, "changed", autospec=True,
+                               side_effect=FileStorage.changed) as changed:
+            City(name="Akron", state_id=state.id)
+            User(email="a@b.c", password="secret")
+            with mock.patch.object(FileStorage, "_FileStorage__stamps", {}):
+                models.storage.reload()
+            self.assertEqual(changed.call_count, 0)
+            state = models.storage.get(State, state.id)
+            self.assertEqual(state.name, "Ohio")
+            state.name = "Iowa"
+            self.assertEqual(changed.call_count, 1)
+        self.assertEqual(models.storage.sorted_by_name(State), [state])
+
+    def test_relationships_ignore_assigned_values(self):
+        """Test that the relationship properties ignore the values given
+        to the constructor, setattr or a stored record."""
+        user = User(places=[], reviews=["x"], email="a@b.c")
+        city = City(places=[], name="Fresno")
+        place = Place(user_id=user.id, city_id=city.id)
+        for obj in [user, city, place]:
+            models.storage.new(obj)
+        setattr(user, "places", [])
+        self.assertEqual(user.places, [place])
+        self.assertEqual(user.reviews, [])
+        self.assertEqual(city.places, [place])
+        self.assertNotIn("places", user.to_dict())
+        models.storage.save()
+        with open(FILE_PATH, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+        stored["User." + user.id]["places"] = []
+        stored["City." + city.id]["places"] = ["x"]
+        with open(FILE_PATH, "w", encoding="utf-8") as f:
+            json.dump(stored, f, indent=4)
+        lazy_methods.empty_object_dictionary(models.storage.all())
+        with mock.patch.object(FileStorage, "_FileStorage__stamps", {}):
+            models.storage.reload()
+        user = models.storage.get(User, user.id)
+        city = models.storage.get(City, city.id)
+        self.assertEqual([p.id for p in user.places], [place.id])
+        self.assertEqual([p.id for p in city.places], [place.id])
+
+    def test_save_keeps_json_dump_layout(self):
+        """Test that save writes the same text as json.dump with indent=4."""
+        expected = {}
+        for value in classes.values():
+            instance = value()
+            models.storage.new(instance)
+            expected[instance.__class__.__name__ + "." + instance.id] = \
+                instance.to_dict()
+        models.storage.save()
+        with open(FILE_PATH, "r", encoding="utf-8") as f:
+            self.assertEqual(f.read(), json.dumps(expected, indent=4))
+
+    @mock.patch.object(FileStorage, "keep_encoded", True)
+    def test_save_serializes_changed_objects_only(self):
+        """Test that save calls to_dict only for the objects created or
+        changed since the last save."""
+        states = [State(name="State {}".format(i)) for i in range(3)]
+        for state in states:
+            models.storage.new(state)
+        models.storage.save()
+        states[1].name = "Renamed"
+        with mock.patch.object(State, "to_dict", autospec=True,
+                               side_effect=State.to_dict) as to_dict:
+            models.storage.save()
+        self.assertEqual(to_dict.call_count, 1)
+        with open(FILE_PATH, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        self.assertEqual(saved["State." + states[1].id]["name"], "Renamed")
+        self.assertEqual(len(saved), 3)
+
+    def test_close_skips_unchanged_file(self):
+        """Test that close keeps the loaded objects when the JSON file hasn't
+        changed since the last save."""
+        state = State(name="Maine")
+        state.save()
+        with mock.patch.object(State, "__init__", autospec=True,
+                               side_effect=State.__init__) as init:
+            models.storage.close()
+        self.assertEqual(init.call_count, 0)
+        self.assertIs(models.storage.get(State, state.id), state)
+
+    @mock.patch.object(FileStorage, "keep_encoded", True)
+    def test_reload_picks_up_external_changes(self):
+        """Test that reload rebuilds the objects another writer changed,
+        drops the ones it deleted and keeps the others as they are."""
+        kept = State(name="Idaho")
+        edited = State(name="Kansas")
+        removed = State(name="Alaska")
+        for state in [kept, edited, removed]:
+            models.storage.new(state)
+        models.storage.save()
+        with open(FILE_PATH, "r", encoding="utf-8") as f:
+            on_disk = json.load(f)
+        on_disk["State." + edited.id]["name"] = "Kentucky"
+        del on_disk["State." + removed.id]
+        with open(FILE_PATH, "w", encoding="utf-8") as f:
+            json.dump(on_disk, f, indent=4)
+        models.storage.reload()
+        self.assertIs(models.storage.get(State, kept.id), kept)
+        self.assertEqual(models.storage.get(State, edited.id).name,
+                         "Kentucky")
+        self.assertIsNone(models.storage.get(State, removed.id))
+
+    @mock.patch.object(FileStorage, "lazy", False)
+    @mock.patch.object(FileStorage, "keep_encoded", False)
+    def test_encoded_not_kept(self):
+        """Test that without keep_encoded the encoded form of the objects
+        isn't kept after a reload or a save, and that saves still write every
+        object and leave out the changes of an open batch, and that
+        reloads drop the objects deleted from the file."""
+        states = [State(name=str(i)) for i in range(3)]
+        for state in states:
+            models.storage.new(state)
+        models.storage.save()
+        self.assertEqual(FileStorage._FileStorage__encoded, {})
+        with open(FILE_PATH, "r", encoding="utf-8") as f:
+            on_disk = json.load(f)
+        del on_disk["State." + states[2].id]
+        with open(FILE_PATH, "w", encoding="utf-8") as f:
+            json.dump(on_disk, f, indent=4)
+        lazy_methods.empty_object_dictionary(models.storage.all())
+        models.storage.new(states[0])
+        models.storage.reload()
+        self.assertEqual(FileStorage._FileStorage__encoded, {})
+        self.assertEqual(models.storage.count(State), 2)
+        self.assertIsNone(models.storage.get(State, states[2].id))
+        state = models.storage.get(State, states[0].id)
+        with models.storage.batch():
+            state.name = "Held"
+            thread = threading.Thread(target=models.storage.save)
+            thread.start()
+            thread.join()
+            with open(FILE_PATH, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            self.assertEqual(saved["State." + state.id]["name"], "0")
+        with open(FILE_PATH, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        self.assertEqual(saved["State." + state.id]["name"], "Held")
+        self.assertEqual(len(saved), 2)
+        self.assertEqual(FileStorage._FileStorage__encoded, {})
+
+    @mock.patch.object(FileStorage, "keep_encoded", False)
+    def test_encoded_not_kept_batch_isolated(self):
+        """Test that without keep_encoded the saves of other threads don't
+        write the changes of an open batch."""
+        check_batch_isolation(self)
+
+    def test_query(self):
+        """Test that a query filters, orders and limits the objects,
+        starting from the foreign key index."""
+        city = City(name="Akron")
+        other = City(name="Dayton")
+        places = [Place(name=name, price_by_night=price, city_id=city_id)
+                  for name, price, city_id in [
+                      ("d", 50, city.id), ("a", 150, city.id),
+                      ("c", 100, city.id), ("b", 80, city.id),
+                      ("e", 10, other.id)]]
+        for obj in [city, other] + places:
+            models.storage.new(obj)
+        query = models.storage.query(Place).filter(
+            city_id=city.id, price_by_night__lte=100).order_by("name")
+        with mock.patch.object(FileStorage, "all") as scan:
+            self.assertEqual([p.name for p in query], ["b", "c", "d"])
+            self.assertEqual([p.name for p in query.limit(2)], ["b", "c"])
+            self.assertFalse(scan.called)
+        self.assertEqual(query.order_by("-price_by_night").first().name,
+                         "b")
+        self.assertEqual(query.count(), 3)
+        self.assertEqual([p.name for p in models.storage.query("Place")
+                          .filter(name__in=["a", "e"]).order_by("-name")],
+                         ["e", "a"])
+        self.assertEqual(models.storage.query(Place).filter(
+            id=places[0].id).all(), [places[0]])
+        self.assertEqual(models.storage.query(Place).filter(
+            description__ne="x").count(), 5)
+        with self.assertRaises(ValueError):
+            models.storage.query(Place).filter(name__like="a")
+
+    def test_sorted_by_name(self):
+        """Test that the name indexes follow the objects created, renamed,
+        moved to another parent and deleted."""
+        state = State(name="Ohio")
+        other = State(name="Iowa")
+        cities = [City(name=name, state_id=state.id)
+                  for name in ["Toledo", "Akron", "Dayton"]]
+        for obj in [state, other] + cities:
+            models.storage.new(obj)
+
+        def names(*args):
+            return [obj.name for obj in models.storage.sorted_by_name(*args)]
+        self.assertEqual(names(City, "state_id", state.id),
+                         ["Akron", "Dayton", "Toledo"])
+        cities[0].name = "Canton"
+        cities[1].state_id = other.id
+        self.assertEqual(names(City, "state_id", state.id),
+                         ["Canton", "Dayton"])
+        self.assertEqual(names("City", "state_id", other.id), ["Akron"])
+        models.storage.delete(cities[2])
+        self.assertEqual(names(City), ["Akron", "Canton"])
+        self.assertEqual(names(State), ["Iowa", "Ohio"])
+        with mock.patch.object(FileStorage, "all") as scan:
+            self.assertEqual([c.name for c in models.storage.query(City)
+                              .filter(state_id=state.id).order_by("-name")],
+                             ["Canton"])
+            self.assertFalse(scan.called)
+        models.storage.save()
+        lazy_methods.empty_object_dictionary(models.storage.all())
+        models.storage.reload()
+        self.assertEqual(names(State), ["Iowa", "Ohio"])
+
+    def test_reload_interns_ids(self):
+        """Test that the objects reloaded share one string per distinct
+        id-like value."""
+        state = State(name="Nevada")
+        first = City(name="Reno", state_id=state.id)
+        second = City(name="Elko", state_id=state.id)
+        for obj in [state, first, second]:
+            models.storage.new(obj)
+        models.storage.save()
+        lazy_methods.empty_object_dictionary(models.storage.all())
+        models.storage.reload()
+        state = models.storage.get(State, state.id)
+        first = models.storage.get(City, first.id)
+        second = models.storage.get(City, second.id)
+        self.assertIs(first.state_id, second.state_id)
+        self.assertIs(first.state_id, state.id)
+
+    def test_save_leaves_no_temporary_file(self):
+        """Test that save replaces the JSON file through a temporary file
+        that doesn't outlive it."""
+        models.storage.new(State(name="Vermont"))
+        models.storage.save()
+        directory = os.path.dirname(os.path.abspath(FILE_PATH))
+        prefix = os.path.basename(FILE_PATH) + "."
+        leftovers = [name for name in os.listdir(directory)
+                     if name.startswith(prefix) and name.endswith(".tmp")]
+        self.assertEqual(leftovers, [])
+
+    def test_concurrent_saves_are_grouped(self):
+        """Test that saves of threads arriving together share writes."""
+        writes = []
+        write = FileStorage._write
+
+        def counting_write(storage, segments, changed):
+            """records each write"""
+            writes.append(len(changed))
+            write(storage, segments, changed)
+
+        states = [State(name="State {}".format(i)) for i in range(8)]
+        threads = [threading.Thread(target=state.save) for state in states]
+        with mock.patch.object(FileStorage, "_write", counting_write), \
+                mock.patch.object(FileStorage, "group_commit_window", 0.05):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertLess(len(writes), len(states))
+        with open(FILE_PATH, "r", encoding="utf-8") as f:
+            self.assertEqual(len(json.load(f)), len(states))
+
+    def test_lazy_reload_builds_objects_on_access(self):
+        """Test that in lazy mode reload builds no object, count doesn't
+        build any either and get or all build the ones they return."""
+        states = [State(name=str(i)) for i in range(3)]
+        for state in states:
+            models.storage.new(state)
+        models.storage.save()
+        lazy_methods.empty_object_dictionary(models.storage.all())
+        with mock.patch.object(FileStorage, "lazy", True), \
+                mock.patch.object(State, "__init__", autospec=True,
+                                  side_effect=State.__init__) as init:
+            models.storage.reload()
+            self.assertEqual(models.storage.count(State), 3)
+            self.assertEqual(init.call_count, 0)
+            state = models.storage.get(State, states[0].id)
+            self.assertEqual(state.name, "0")
+            self.assertEqual(init.call_count, 1)
+            models.storage.save()
+            self.assertEqual(len(models.storage.all(State)), 3)
+            self.assertEqual(init.call_count, 3)
+        with open(FILE_PATH, "r", encoding="utf-8") as f:
+            self.assertEqual(len(json.load(f)), 3)
+
+    def test_lazy_related_builds_matches(self):
+        """Test that in lazy mode a relationship builds only the objects it
+        returns."""
+        with mock.patch.object(FileStorage, "lazy", True):
+            check_related_builds_matches(self)
+
+    def test_snapshot_while_another_thread_changes(self):
+        """Test that all(cls) returns the last consistent snapshot, without
+        waiting, while another thread is in the middle of changes, and that
+        the thread making them sees them."""
+        first = State(name="First")
+        models.storage.new(first)
+        self.assertEqual(list(models.storage.all(State)),
+                         ["State." + first.id])
+        seen = []
+        reader = threading.Thread(
+            target=lambda: seen.append(models.storage.all(State)))
+        with FileStorage._FileStorage__write_lock:
+            second = State(name="Second")
+            models.storage.new(second)
+            reader.start()
+            reader.join(5)
+            self.assertFalse(reader.is_alive())
+            self.assertEqual(len(models.storage.all(State)), 2)
+        self.assertEqual(list(seen[0]), ["State." + first.id])
+        self.assertEqual(len(models.storage.all(State)), 2)
+
+    def test_snapshot_is_not_changed_by_writes(self):
+        """Test that a snapshot can be iterated while objects are added."""
+        models.storage.new(State(name="First"))
+        snapshot = models.storage.all(State)
+        for _ in snapshot.values():
+            models.storage.new(State(name="Next"))
+        self.assertEqual(len(snapshot), 1)
+
+    def test_save_writes_deleted_and_reassigned_attributes(self):
+        """Test that save writes the attributes deleted and the lists
+        assigned again since the last save."""
+        place = Place(name="Loft", amenity_ids=["a"], motto="Hi")
+        place.save()
+        del place.motto
+        place.amenity_ids = place.amenity_ids + ["b"]
+        models.storage.save()
+        with open(FILE_PATH, "r", encoding="utf-8") as f:
+            saved = json.load(f)["Place." + place.id]
+        self.assertNotIn("motto", saved)
+        self.assertEqual(saved["amenity_ids"], ["a", "b"])
+
+    def test_batch_saves_once(self):
+        """Test that the saves of a batch block make one write at its
+        end."""
+        with mock.patch.object(FileStorage, "_flush", autospec=True,
+                               side_effect=FileStorage._flush) as flush:
+            with models.storage.batch():
+                states = [State(name=str(i)) for i in range(5)]
+                for state in states:
+                    state.save()
+                with models.storage.batch():
+                    states[0].delete()
+                self.assertEqual(flush.call_count, 0)
+            self.assertEqual(flush.call_count, 1)
+        with open(FILE_PATH, "r", encoding="utf-8") as f:
+            self.assertEqual(len(json.load(f)), 4)
+
+    def test_batch_rollback(self):
+        """Test that a batch block raising restores the objects and
+        attributes it changed and saves nothing."""
+        kept = State(name="Kept")
+        kept.save()
+        gone = State(name="Gone")
+        gone.save()
+        city = City(name="Town", state_id=kept.id)
+        city.save()
+        with self.assertRaises(ValueError):
+            with models.storage.batch():
+                State(name="New").save()
+                kept.name = "Renamed"
+                kept.motto = "New attribute"
+                city.state_id = gone.id
+                city.save()
+                gone.delete()
+                raise ValueError("abort")
+        self.assertEqual(set(models.storage.all(State)),
+                         {"State." + kept.id, "State." + gone.id})
+        self.assertEqual(kept.name, "Kept")
+        self.assertNotIn("motto", kept.__dict__)
+        self.assertEqual(city.state_id, kept.id)
+        self.assertEqual([c.id for c in kept.cities], [city.id])
+        self.assertEqual(gone.cities, [])
+        with open(FILE_PATH, "r", encoding="utf-8") as f:
+            self.assertEqual(len(json.load(f)), 3)
+        self.assertFalse(FileStorage._FileStorage__changed)
+
+    def test_batch_rollback_keeps_password(self):
+        """Test that a batch block raising restores a changed password as
+        stored, without hashing it again."""
+        user = User(email="a@b.c", password="secret")
+        user.save()
+        stored = user.password
+        with self.assertRaises(ValueError):
+            with models.storage.batch():
+                user.password = "other"
+                user.save()
+                raise ValueError("abort")
+        self.assertEqual(user.password, stored)
+        self.assertEqual(user.to_dict()["password"], stored)
+        self.assertNotIn("User." + user.id, FileStorage._FileStorage__changed)
+
+    def test_batch_isolated_from_other_threads(self):
+        """Test that the saves of other threads don't write the changes of
+        an open batch."""
+        check_batch_isolation(self)
+
+
+@unittest.skipIf(models.storage_t == "db", "file storage")
+class TestFileStorageJournal(unittest.TestCase):
+    """Test the journal mode of the FileStorage class"""
+
+    def setUp(self) -> None:
+        lazy_methods.empty_object_dictionary(models.storage.all())
+        models.storage.compact()
+        patcher = mock.patch.object(FileStorage, "journal", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(models.storage.compact)
+
+    def test_save_appends_changes_only(self):
+        """Test that save appends the changed objects to the journal and
+        leaves the JSON file untouched."""
+        state = State(name="Texas")
+        state.save()
+        with open(FILE_PATH, "r", encoding="utf-8") as f:
+            self.assertEqual(json.load(f), {})
+        with open(FILE_PATH + ".journal", "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(records, [{"key": "State." + state.id,
+                                    "value": state.to_dict()}])
+
+    def test_reload_replays_journal(self):
+        """Test that reload applies the journaled saves and deletes on top
+        of the JSON file."""
+        kept = State(name="Ohio")
+        kept.save()
+        gone = State(name="Utah")
+        gone.save()
+        kept.name = "Oregon"
+        kept.save()
+        gone.delete()
+        lazy_methods.empty_object_dictionary(models.storage.all())
+        models.storage.reload()
+        self.assertEqual(list(models.storage.all(State)),
+                         ["State." + kept.id])
+        self.assertEqual(models.storage.get(State, kept.id).name, "Oregon")
+
+    def test_append_after_torn_record(self):
+        """Test that a save following a record torn by a crash drops it
+        instead of appending after it, which would hide the save."""
+        first = State(name="Ohio")
+        first.save()
+        with open(FILE_PATH + ".journal", "a", encoding="utf-8") as f:
+            f.write('{"key": "State.torn", "val')
+        lazy_methods.empty_object_dictionary(models.storage.all())
+        with mock.patch.object(FileStorage, "_FileStorage__stamps", {}):
+            models.storage.reload()
+        second = State(name="Utah")
+        second.save()
+        lazy_methods.empty_object_dictionary(models.storage.all())
+        with mock.patch.object(FileStorage, "_FileStorage__stamps", {}):
+            models.storage.reload()
+        self.assertEqual(sorted(models.storage.all(State)),
+                         sorted(["State." + first.id, "State." + second.id]))
+
+    def test_compaction_past_max_size(self):
+        """Test that the journal is folded into the JSON file once it grows
+        past journal_max_size."""
+        with mock.patch.object(FileStorage, "journal_max_size", 0):
+            state = State(name="Iowa")
+            state.save()
+        self.assertFalse(os.path.exists(FILE_PATH + ".journal"))
+        with open(FILE_PATH, "r", encoding="utf-8") as f:
+            self.assertIn("State." + state.id, json.load(f))
+
+    def test_batch_isolated_from_other_threads(self):
+        """Test that the saves of other threads don't write the changes of
+        an open batch."""
+        check_batch_isolation(self)
+
+
+@unittest.skipIf(models.storage_t == "db", "file storage")
+class TestFileStorageSharded(unittest.TestCase):
+    """Test the sharded layout of the FileStorage class"""
+
+    def setUp(self) -> None:
+        lazy_methods.empty_object_dictionary(models.storage.all())
+        models.storage.compact()
+        for name, value in [("sharded", True),
+                            ("_FileStorage__loaded", set()),
+                            ("_FileStorage__stamps", {})]:
+            patcher = mock.patch.object(FileStorage, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, FILE_PATH + ".d", True)
+        self.addCleanup(lazy_methods.empty_object_dictionary,
+                        FileStorage._FileStorage__objects)
+
+    def read(self, name):
+        """returns the objects saved in the file name of the layout"""
+        with open(os.path.join(FILE_PATH + ".d", name), "r",
+                  encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_save_writes_one_file_per_class(self):
+        """Test that each class is saved in its own file."""
+        state = State(name="Georgia")
+        user = User(email="a@b.c")
+        state.save()
+        user.save()
+        self.assertEqual(list(self.read("State.json")),
+                         ["State." + state.id])
+        self.assertEqual(list(self.read("User.json")), ["User." + user.id])
+
+    def test_save_rewrites_changed_classes_only(self):
+        """Test that saving an object leaves the files of other classes
+        untouched."""
+        user = User(email="a@b.c")
+        user.save()
+        before = os.stat(os.path.join(FILE_PATH + ".d", "User.json"))
+        State(name="Hawaii").save()
+        after = os.stat(os.path.join(FILE_PATH + ".d", "User.json"))
+        self.assertEqual(before.st_ino, after.st_ino)
+        self.assertEqual(before.st_mtime_ns, after.st_mtime_ns)
+
+    def test_classes_load_on_first_use(self):
+        """Test that reload reads no class and a class is read the first
+        time it's used."""
+        state = State(name="Florida")
+        state.save()
+        User(email="a@b.c").save()
+        lazy_methods.empty_object_dictionary(
+            FileStorage._FileStorage__objects)
+        with mock.patch.object(FileStorage, "_FileStorage__loaded", set()), \
+                mock.patch.object(User, "__init__", autospec=True,
+                                  side_effect=User.__init__) as user_init:
+            models.storage.reload()
+            self.assertEqual(FileStorage._FileStorage__objects, {})
+            self.assertEqual(list(models.storage.all(State)),
+                             ["State." + state.id])
+            self.assertEqual(user_init.call_count, 0)
+            self.assertEqual(models.storage.count(User), 1)
+            # in lazy mode, counting builds no object
+            self.assertEqual(user_init.call_count,
+                             0 if models.storage.lazy else 1)
+
+    def test_hash_shards(self):
+        """Test that a class is split across `shards` files."""
+        with mock.patch.object(FileStorage, "shards", 2):
+            states = [State(name=str(i)) for i in range(20)]
+            for state in states:
+                models.storage.new(state)
+            models.storage.save()
+            saved = {}
+            saved.update(self.read("State.0.json"))
+            saved.update(self.read("State.1.json"))
+        self.assertEqual(len(saved), 20)
+
+    def check_reshards(self, before, after, recorded=True):
+        """checks that the State objects saved with `before` shards load
+        with `after` shards, moved to the files of `after` shards"""
+        extension = models.storage.file_format.extension
+        with mock.patch.object(FileStorage, "shards", before):
+            keys = set()
+            for i in range(20):
+                state = State(name=str(i))
+                models.storage.new(state)
+                keys.add("State." + state.id)
+            models.storage.save()
+        if not recorded:
+            os.remove(os.path.join(FILE_PATH + ".d", "shards.json"))
+        lazy_methods.empty_object_dictionary(
+            FileStorage._FileStorage__objects)
+        with mock.patch.object(FileStorage, "shards", after), \
+                mock.patch.object(FileStorage, "_FileStorage__loaded",
+                                  set()):
+            models.storage.reload()
+            self.assertEqual(set(models.storage.all(State)), keys)
+            self.assertEqual(models.storage.count(State), 20)
+        names = ["State.{}{}".format(shard, extension)
+                 for shard in range(after)] if after > 1 else \
+            ["State" + extension]
+        self.assertEqual(sorted(name for name in os.listdir(FILE_PATH + ".d")
+                                if name.startswith("State")), names)
+        self.assertEqual(self.read("shards.json")["State"], after)
+
+    def test_fewer_shards_reshard(self):
+        """Test that the files of more shards are re-sharded on first use
+        of their class."""
+        self.check_reshards(3, 2)
+
+    def test_more_shards_reshard(self):
+        """Test that the files of fewer shards are re-sharded, although
+        their names are among the new ones."""
+        self.check_reshards(2, 3)
+
+    def test_unrecorded_shards_reshard(self):
+        """Test that files of another number of shards are re-sharded when
+        no file records their number."""
+        self.check_reshards(1, 4, recorded=False)
+
+    def test_batch_isolated_from_other_threads(self):
+        """Test that the saves of other threads don't write the changes of
+        an open batch."""
+        check_batch_isolation(self)
+
+
+@unittest.skipIf(models.storage_t == "db", "file storage")
+class TestFileStorageMapped(unittest.TestCase):
+    """Test the memory-mapped mode of the FileStorage class"""
+
+    path = os.path.splitext(FILE_PATH)[0] + BinaryFormat.extension
+
+    def setUp(self) -> None:
+        lazy_methods.empty_object_dictionary(models.storage.all())
+        models.storage.compact()
+        for name, value in [("mapped", True),
+                            ("file_format", BinaryFormat),
+                            ("_FileStorage__store", None),
+                            ("_FileStorage__stamps", {})]:
+            patcher = mock.patch.object(FileStorage, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(os.remove, self.path)
+        self.addCleanup(self.close_store)
+        self.addCleanup(lazy_methods.empty_object_dictionary,
+                        FileStorage._FileStorage__objects)
+        # builds the objects still only indexed while the file is mapped
+        self.addCleanup(models.storage.all)
+
+    @staticmethod
+    def close_store():
+        """unmaps the file mapped by the test"""
+        if FileStorage._FileStorage__store is not None:
+            FileStorage._FileStorage__store.close()
+
+    def test_save_appends_changes(self):
+        """Test that a save appends the changed objects to the file and
+        deletions are appended as well."""
+        states = [State(name=str(i)) for i in range(4)]
+        for state in states:
+            models.storage.new(state)
+        models.storage.save()
+        size = os.path.getsize(self.path)
+        states[0].name = "Renamed"
+        models.storage.save()
+        self.assertGreater(os.path.getsize(self.path), size)
+        models.storage.delete(states[1])
+        lazy_methods.empty_object_dictionary(
+            FileStorage._FileStorage__objects)
+        with mock.patch.object(FileStorage, "_FileStorage__stamps", {}):
+            models.storage.reload()
+        self.assertEqual(models.storage.count(State), 3)
+        self.assertEqual(models.storage.get(State, states[0].id).name,
+                         "Renamed")
+        self.assertIsNone(models.storage.get(State, states[1].id))
+
+    def test_reload_builds_objects_on_access(self):
+        """Test that reload only indexes the records and get builds the
+        object it returns."""
+        states = [State(name=str(i)) for i in range(3)]
+        for state in states:
+            models.storage.new(state)
+        models.storage.save()
+        lazy_methods.empty_object_dictionary(
+            FileStorage._FileStorage__objects)
+        with mock.patch.object(FileStorage, "_FileStorage__stamps", {}), \
+                mock.patch.object(State, "__init__", autospec=True,
+                                  side_effect=State.__init__) as init:
+            models.storage.reload()
+            self.assertEqual(models.storage.count(State), 3)
+            self.assertEqual(init.call_count, 0)
+            self.assertEqual(models.storage.get(State, states[2].id).name,
+                             "2")
+            self.assertEqual(init.call_count, 1)
+        self.assertEqual(FileStorage._FileStorage__encoded, {})
+
+    def test_related_builds_matches(self):
+        """Test that a relationship builds only the objects it returns."""
+        check_related_builds_matches(self)
+
+    def test_reload_reads_no_record(self):
+        """Test that reload reads no record, even for the reverse foreign
+        key indexes, which the first relationship access of a class
+        reads."""
+        state = State(name="Utah")
+        models.storage.new(state)
+        for name in ["Provo", "Ogden"]:
+            models.storage.new(City(name=name, state_id=state.id))
+        models.storage.save()
+        lazy_methods.empty_object_dictionary(
+            FileStorage._FileStorage__objects)
+        with mock.patch.object(FileStorage, "_FileStorage__stamps", {}), \
+                mock.patch.object(BinaryFormat, "fields",
+                                  side_effect=BinaryFormat.fields) as fields, \
+                mock.patch.object(BinaryFormat, "decode",
+                                  side_effect=BinaryFormat.decode) as decode:
+            models.storage.reload()
+            self.assertEqual(fields.call_count + decode.call_count, 0)
+            state = models.storage.get(State, state.id)
+            self.assertEqual(sorted(city.name for city in state.cities),
+                             ["Ogden", "Provo"])
+            self.assertEqual(fields.call_count, 2)
+
+    def test_compaction(self):
+        """Test that the file is rewritten once replaced records take more
+        than half of it."""
+        state = State(name="Maine")
+        state.save()
+        size = os.path.getsize(self.path)
+        for i in range(3):
+            state.name = "Maine {}".format(i)
+            state.save()
+        store = FileStorage._FileStorage__store
+        self.assertLess(os.path.getsize(self.path), size * 2)
+        self.assertLessEqual(store.garbage * 2, store.size)
+        lazy_methods.empty_object_dictionary(
+            FileStorage._FileStorage__objects)
+        with mock.patch.object(FileStorage, "_FileStorage__stamps", {}):
+            models.storage.reload()
+        self.assertEqual(models.storage.get(State, state.id).name,
+                         "Maine 2")
+
+    def test_batch_isolated_from_other_threads(self):
+        """Test that the saves of other threads don't write the changes of
+        an open batch."""
+        check_batch_isolation(self)
+
+
+@unittest.skipIf(models.storage_t == "db", "file storage")
+class TestFileStorageShared(unittest.TestCase):
+    """Test the FileStorage class sharing its file with other processes"""
+
+    def setUp(self) -> None:
+        lazy_methods.empty_object_dictionary(models.storage.all())
+        models.storage.compact()
+        # the lock file already opened by the storage, when shared, is
+        # restored once the one of the test is closed
+        for name, value in [("shared", True),
+                            ("_FileStorage__lock_fd", None),
+                            ("_FileStorage__lock_pid", None),
+                            ("_FileStorage__sequence", None)]:
+            patcher = mock.patch.object(FileStorage, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(os.remove, FILE_PATH + ".lock")
+        self.addCleanup(self.close_lock_file)
+        self.addCleanup(lazy_methods.empty_object_dictionary,
+                        FileStorage._FileStorage__objects)
+
+    @staticmethod
+    def close_lock_file():
+        """closes the lock file opened by the test"""
+        if FileStorage._FileStorage__lock_pid == os.getpid():
+            os.close(FileStorage._FileStorage__lock_fd)
+            FileStorage._FileStorage__lock_pid = None
+
+    def other_process(self, code):
+        """runs code in another process sharing the file and returns what
+        it prints"""
+        env = {name: value for name, value in os.environ.items()
+               if not name.startswith("HBNB_")}
+        env["HBNB_FILE_SHARED"] = "1"
+        if FILE_PATH != "file.json":
+            env["HBNB_ENV"] = "test"
+        script = ("import models\n"
+                  "from models.state import State\n" + code)
+        return subprocess.run([sys.executable, "-c", script], env=env,
+                              check=True, stdout=subprocess.PIPE,
+                              universal_newlines=True).stdout.strip()
+
+    def test_save_merges_other_processes(self):
+        """Test that a save keeps the objects saved by another process
+        since this one loaded the file."""
+        first = State(name="First")
+        first.save()
+        other = self.other_process(
+            "state = State(name='Other')\n"
+            "state.save()\n"
+            "print(state.id)")
+        last = State(name="Last")
+        last.save()
+        with open(FILE_PATH, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        self.assertEqual(sorted(saved), sorted(
+            "State." + state_id for state_id in [first.id, other, last.id]))
+
+    def test_reads_see_other_processes(self):
+        """Test that reads merge the saves of another process, keeping the
+        changes not saved yet."""
+        kept = State(name="Kept")
+        kept.save()
+        gone = State(name="Gone")
+        gone.save()
+        kept.name = "Changed"
+        other = self.other_process(
+            "models.storage.delete(models.storage.get(State, {!r}))\n"
+            "state = State(name='Other')\n"
+            "state.save()\n"
+            "print(state.id)".format(gone.id))
+        self.assertEqual(models.storage.get(State, other).name, "Other")
+        self.assertIsNone(models.storage.get(State, gone.id))
+        self.assertEqual(models.storage.get(State, kept.id).name, "Changed")
+        self.assertEqual(models.storage.count(State), 2)
+
+    def test_sequence_counts_writes(self):
+        """Test that each save adds one to the change sequence number."""
+        before = models.storage._read_sequence()
+        State(name="One").save()
+        State(name="Two").save()
+        self.assertEqual(models.storage._read_sequence(), before + 2)
+
+
+@unittest.skipIf(models.storage_t == "db", "file storage")
+class TestFileStorageWriteBehind(unittest.TestCase):
+    """Test the write-behind mode of the FileStorage class"""
+
+    def setUp(self) -> None:
+        lazy_methods.empty_object_dictionary(models.storage.all())
+        models.storage.compact()
+        for name, value in [("write_behind", True),
+                            ("flush_interval", 60)]:
+            patcher = mock.patch.object(FileStorage, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(models.storage.flush)
+
+    def saved(self):
+        """returns the keys in the JSON file"""
+        with open(FILE_PATH, "r", encoding="utf-8") as f:
+            return list(json.load(f))
+
+    def test_save_returns_before_writing(self):
+        """Test that save leaves the file as it is until flush."""
+        state = State(name="Vermont")
+        state.save()
+        self.assertEqual(self.saved(), [])
+        models.storage.flush()
+        self.assertEqual(self.saved(), ["State." + state.id])
+
+    def test_close_keeps_changes_not_written(self):
+        """Test that close, called after each API request, keeps the saved
+        objects the background thread didn't write yet."""
+        state = State(name="Kansas")
+        state.save()
+        models.storage.close()
+        self.assertIs(models.storage.get(State, state.id), state)
+
+    def test_threshold_wakes_background_write(self):
+        """Test that the background thread writes once flush_threshold
+        objects changed, without waiting for the interval."""
+        with mock.patch.object(FileStorage, "flush_threshold", 2):
+            State(name="Idaho").save()
+            State(name="Maine").save()
+            for _ in range(100):
+                if len(self.saved()) == 2:
+                    break
+                threading.Event().wait(0.05)
+        self.assertEqual(len(self.saved()), 2)
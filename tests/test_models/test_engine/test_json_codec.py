@@ -0,0 +1,128 @@
+#!/usr/bin/python3
+"""
+Contains the TestJsonCodecDocs and TestJsonCodecs classes
+"""
+
+from datetime import datetime
+import json
+import unittest
+import pep8
+from models.engine import json_codec
+
+
+class TestJsonCodecDocs(unittest.TestCase):
+    """Tests to check the documentation and style of json_codec"""
+
+    def test_pep8_conformance_json_codec(self):
+        """Test that models/engine/json_codec.py conforms to pep8."""
+        pep8s = pep8.StyleGuide(quiet=True)
+        result = pep8s.check_files(["models/engine/json_codec.py",
+                                    "tests/test_models/test_engine/"
+                                    "test_json_codec.py"])
+        self.assertEqual(
+            result.total_errors, 0, "Found code style errors (and warnings)."
+        )
+
+    def test_json_codec_module_docstring(self):
+        """Test for the json_codec.py module docstring"""
+        self.assertIsNot(json_codec.__doc__, None,
+                         "json_codec.py needs a docstring")
+        self.assertTrue(len(json_codec.__doc__) >= 1,
+                        "json_codec.py needs a docstring")
+
+    def test_codec_docstrings(self):
+        """Test for the presence of docstrings in the codecs"""
+        for codec in json_codec.codecs.values():
+            for name in ["dumps", "loads", "record"]:
+                self.assertTrue(getattr(codec, name).__doc__)
+
+
+class TestJsonCodecs(unittest.TestCase):
+    """Test that every codec writes what the json module writes"""
+
+    value = {
+        "id": "1",
+        "name": 'Line\n"1"',
+        "amenity_ids": ["a", "b"],
+        "empty": [],
+        "extra": {"nested": {"list": [1, 2.5, None, True]}},
+        "latitude": -1.5,
+    }
+
+    def test_record(self):
+        """Test the layout of the objects in a file"""
+        expected = json.dumps({"key": self.value}, indent=4)
+        for name, codec in json_codec.codecs.items():
+            with self.subTest(codec=name):
+                text = '{\n    "key": ' + codec.record(self.value) + "\n}"
+                self.assertEqual(text, expected)
+
+    def test_dumps(self):
+        """Test the compact and indented texts, keys sorted or not"""
+        for name, codec in json_codec.codecs.items():
+            for sort_keys in [False, True]:
+                with self.subTest(codec=name, sort_keys=sort_keys):
+                    self.assertEqual(
+                        codec.dumps(self.value, sort_keys=sort_keys),
+                        json.dumps(self.value, sort_keys=sort_keys,
+                                   separators=(",", ":")))
+                    self.assertEqual(
+                        codec.dumps(self.value, sort_keys=sort_keys,
+                                    indent=2),
+                        json.dumps(self.value, sort_keys=sort_keys,
+                                   indent=2))
+
+    def test_values_past_orjson(self):
+        """Test that integers past 64 bits and NaN or infinite floats are
+        written as the json module writes them"""
+        value = {"big": 99999999999999999999999, "nan": float("nan"),
+                 "inf": [float("-inf")], "none": None}
+        for name, codec in json_codec.codecs.items():
+            with self.subTest(codec=name):
+                self.assertEqual(codec.dumps(value),
+                                 json.dumps(value, separators=(",", ":")))
+                self.assertEqual(
+                    "{\n    \"key\": " + codec.record(value) + "\n}",
+                    json.dumps({"key": value}, indent=4))
+
+    def test_round_trip_past_orjson(self):
+        """Test that integers past 64 bits read back as the same integers"""
+        value = {"big": 2 ** 70 + 1, "negative": -2 ** 64,
+                 "u64": 2 ** 64 - 1, "list": [10 ** 30]}
+        for name, codec in json_codec.codecs.items():
+            with self.subTest(codec=name):
+                for text in [codec.dumps(value), codec.record(value)]:
+                    self.assertEqual(codec.loads(text), value)
+                    self.assertEqual(codec.loads(text.encode()), value)
+                    self.assertEqual(codec.loads(text),
+                                     json.loads(text))
+
+    def test_dumps_default(self):
+        """Test that dates and unknown types go through default"""
+        for name, codec in json_codec.codecs.items():
+            with self.subTest(codec=name):
+                self.assertEqual(
+                    codec.dumps([datetime(2017, 9, 28)], default=str),
+                    '["2017-09-28 00:00:00"]')
+                with self.assertRaises(TypeError):
+                    codec.dumps([object()])
+
+    def test_loads(self):
+        """Test reading text, bytes, NaN and invalid JSON"""
+        text = json.dumps(self.value)
+        for name, codec in json_codec.codecs.items():
+            with self.subTest(codec=name):
+                self.assertEqual(codec.loads(text), self.value)
+                self.assertEqual(codec.loads(text.encode("utf-8")),
+                                 self.value)
+                self.assertNotEqual(codec.loads("[NaN]")[0],
+                                    codec.loads("[NaN]")[0])
+                with self.assertRaises(ValueError):
+                    codec.loads('{"id": ')
+
+    def test_default_codec(self):
+        """Test that orjson is used when it's installed"""
+        if json_codec.orjson is None:
+            self.assertIs(json_codec.codec, json_codec.StdlibCodec)
+        else:
+            self.assertIn(json_codec.codec, json_codec.codecs.values())
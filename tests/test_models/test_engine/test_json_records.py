@@ -0,0 +1,106 @@
+#!/usr/bin/python3
+"""
+Contains the TestJsonRecordsDocs and TestJsonRecords classes
+"""
+
+import inspect
+import io
+import json
+import unittest
+import pep8
+from models.engine import json_records
+
+
+class TestJsonRecordsDocs(unittest.TestCase):
+    """Tests to check the documentation and style of json_records"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up for the doc tests"""
+        cls.jr_f = inspect.getmembers(json_records, inspect.isfunction)
+
+    def test_pep8_conformance_json_records(self):
+        """Test that models/engine/json_records.py conforms to pep8."""
+        pep8s = pep8.StyleGuide(quiet=True)
+        result = pep8s.check_files(["models/engine/json_records.py",
+                                    "tests/test_models/test_engine/"
+                                    "test_json_records.py"])
+        self.assertEqual(
+            result.total_errors, 0, "Found code style errors (and warnings)."
+        )
+
+    def test_json_records_module_docstring(self):
+        """Test for the json_records.py module docstring"""
+        self.assertIsNot(json_records.__doc__, None,
+                         "json_records.py needs a docstring")
+        self.assertTrue(len(json_records.__doc__) >= 1,
+                        "json_records.py needs a docstring")
+
+    def test_json_records_func_docstrings(self):
+        """Test for the presence of docstrings in json_records functions"""
+        for func in self.jr_f:
+            self.assertIsNot(func[1].__doc__, None,
+                             "{} function needs a docstring".format(func[0]))
+            self.assertTrue(len(func[1].__doc__) >= 1,
+                            "{} function needs a docstring".format(func[0]))
+
+
+class TestJsonRecords(unittest.TestCase):
+    """Test reading the objects of a JSON file one at a time"""
+
+    objects = {
+        "State.{}".format(i): {
+            "id": str(i),
+            "name": 'Line\n"{}"'.format(i),
+            "amenity_ids": ["a", "b"],
+            "extra": {},
+            "latitude": 1.5,
+        } for i in range(20)
+    }
+
+    def read(self, text):
+        """returns the records of the JSON text"""
+        return list(json_records.iter_records(io.StringIO(text)))
+
+    def check(self, text):
+        """checks that the records of text hold the objects of text and
+        their JSON text as laid out by encode_value"""
+        expected = json.loads(text)
+        records = self.read(text)
+        self.assertEqual([record[0] for record in records], list(expected))
+        for key, value, loaded in records:
+            self.assertEqual(value, json_records.encode_value(expected[key]))
+            if loaded is not None:
+                self.assertEqual(loaded, expected[key])
+
+    def test_indented_layout(self):
+        """Test the layout written by json.dump(objects, f, indent=4)."""
+        self.check(json.dumps(self.objects, indent=4))
+
+    def test_indented_layout_is_not_parsed(self):
+        """Test that the objects of the indent=4 layout are split without
+        being parsed."""
+        for _, _, loaded in self.read(json.dumps(self.objects, indent=4)):
+            self.assertIsNone(loaded)
+
+    def test_other_layouts(self):
+        """Test compact and differently indented files, read in chunks
+        smaller than a record."""
+        chunk_size = json_records._chunk_size
+        json_records._chunk_size = 7
+        try:
+            self.check(json.dumps(self.objects))
+            self.check(json.dumps(self.objects, indent=2))
+        finally:
+            json_records._chunk_size = chunk_size
+
+    def test_empty_files(self):
+        """Test files holding no object."""
+        self.assertEqual(self.read("{}"), [])
+        self.assertEqual(self.read("{\n}"), [])
+
+    def test_truncated_file(self):
+        """Test that a truncated file raises ValueError."""
+        text = json.dumps(self.objects, indent=4)
+        with self.assertRaises(ValueError):
+            self.read(text[:len(text) // 2])
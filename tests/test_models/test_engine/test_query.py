@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+"""
+Contains the TestQueryDocs and TestQuery classes
+"""
+
+import inspect
+import unittest
+import pep8
+from models.engine import query
+
+
+class TestQueryDocs(unittest.TestCase):
+    """Tests to check the documentation and style of query"""
+
+    def test_pep8_conformance_query(self):
+        """Test that models/engine/query.py conforms to pep8."""
+        pep8s = pep8.StyleGuide(quiet=True)
+        result = pep8s.check_files(["models/engine/query.py",
+                                    "tests/test_models/test_engine/"
+                                    "test_query.py"])
+        self.assertEqual(
+            result.total_errors, 0, "Found code style errors (and warnings)."
+        )
+
+    def test_query_module_docstring(self):
+        """Test for the query.py module docstring"""
+        self.assertIsNot(query.__doc__, None, "query.py needs a docstring")
+        self.assertTrue(len(query.__doc__) >= 1, "query.py needs a docstring")
+
+    def test_query_method_docstrings(self):
+        """Test for the presence of docstrings in Query methods"""
+        for name, method in inspect.getmembers(query.Query,
+                                               inspect.isfunction):
+            self.assertTrue(method.__doc__,
+                            "{} method needs a docstring".format(name))
+
+
+class TestQuery(unittest.TestCase):
+    """Test building queries"""
+
+    def test_chaining_copies(self):
+        """Test that each step returns a new query"""
+        base = query.Query("Place")
+        filtered = base.filter(city_id="1", price_by_night__lte=100)
+        ordered = filtered.order_by("name", "-number_rooms").limit(5)
+        self.assertEqual(base.conditions, ())
+        self.assertEqual(filtered.conditions, (
+            ("city_id", "eq", "1"), ("price_by_night", "lte", 100)))
+        self.assertEqual(filtered.ordering, ())
+        self.assertEqual(ordered.ordering, (("name", False),
+                                            ("number_rooms", True)))
+        self.assertEqual(ordered.max_results, 5)
+        self.assertIsNone(filtered.max_results)
+
+    def test_unknown_operator(self):
+        """Test that an unknown operator raises ValueError"""
+        with self.assertRaises(ValueError):
+            query.Query("Place").filter(name__like="a%")
+
+    def test_results_left_to_storages(self):
+        """Test that the base class doesn't run queries"""
+        with self.assertRaises(NotImplementedError):
+            query.Query("Place").all()
@@ -0,0 +1,114 @@
+#!/usr/bin/python3
+"""
+Contains the TestRecordStoreDocs and TestRecordStore classes
+"""
+
+import inspect
+import os
+import tempfile
+import unittest
+import pep8
+from models.engine import record_store
+from models.engine.binary_records import BinaryFormat
+from models.engine.record_store import RecordStore
+
+
+class TestRecordStoreDocs(unittest.TestCase):
+    """Tests to check the documentation and style of record_store"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up for the doc tests"""
+        cls.rs_f = inspect.getmembers(RecordStore, inspect.isfunction)
+
+    def test_pep8_conformance_record_store(self):
+        """Test that models/engine/record_store.py conforms to pep8."""
+        pep8s = pep8.StyleGuide(quiet=True)
+        result = pep8s.check_files(["models/engine/record_store.py",
+                                    "tests/test_models/test_engine/"
+                                    "test_record_store.py"])
+        self.assertEqual(
+            result.total_errors, 0, "Found code style errors (and warnings)."
+        )
+
+    def test_record_store_module_docstring(self):
+        """Test for the record_store.py module docstring"""
+        self.assertIsNot(record_store.__doc__, None,
+                         "record_store.py needs a docstring")
+        self.assertTrue(len(record_store.__doc__) >= 1,
+                        "record_store.py needs a docstring")
+
+    def test_record_store_class_docstring(self):
+        """Test for the RecordStore class docstring"""
+        self.assertIsNot(RecordStore.__doc__, None,
+                         "RecordStore class needs a docstring")
+        self.assertTrue(len(RecordStore.__doc__) >= 1,
+                        "RecordStore class needs a docstring")
+
+    def test_record_store_func_docstrings(self):
+        """Test for the presence of docstrings in RecordStore methods"""
+        for func in self.rs_f:
+            self.assertIsNot(func[1].__doc__, None,
+                             "{:s} method needs a docstring".format(func[0]))
+            self.assertTrue(len(func[1].__doc__) >= 1,
+                            "{:s} method needs a docstring".format(func[0]))
+
+
+class TestRecordStore(unittest.TestCase):
+    """Test the memory-mapped binary file"""
+
+    def setUp(self):
+        """writes a binary file holding two states"""
+        fd, self.path = tempfile.mkstemp(suffix=".bin")
+        self.addCleanup(os.remove, self.path)
+        self.records = {
+            "State.{}".format(i): BinaryFormat.encode(
+                "State.{}".format(i), {"id": str(i), "name": str(i)})
+            for i in range(2)}
+        with os.fdopen(fd, 'wb') as f:
+            f.write(BinaryFormat.dump(list(self.records.items())))
+
+    def open(self):
+        """maps the file, closing it at the end of the test"""
+        store = RecordStore(self.path)
+        self.addCleanup(store.close)
+        return store
+
+    def test_index(self):
+        """Test that each record is read back from its location."""
+        store = self.open()
+        self.assertEqual(sorted(store.index), sorted(self.records))
+        for key, record in self.records.items():
+            self.assertEqual(store.read(key), record)
+        self.assertEqual(store.garbage, 0)
+        self.assertEqual(store.size, os.path.getsize(self.path))
+
+    def test_append(self):
+        """Test that appended records replace or delete the earlier ones
+        and count as garbage."""
+        store = self.open()
+        renamed = BinaryFormat.encode("State.0", {"id": "0", "name": "x"})
+        store.append([renamed, BinaryFormat.encode("State.1", None)])
+        self.assertEqual(list(store.index), ["State.0"])
+        self.assertEqual(store.read("State.0"), renamed)
+        self.assertEqual(self.open().index, store.index)
+        self.assertEqual(store.garbage, store.size - 5 - 4 - len(renamed))
+
+    def test_torn_append(self):
+        """Test that a record torn by an interrupted append is ignored and
+        overwritten by the next append."""
+        size = os.path.getsize(self.path)
+        with open(self.path, 'ab') as f:
+            f.write(b"\x50\x00\x00\x00\x01")
+        store = self.open()
+        self.assertEqual(store.size, size)
+        self.assertEqual(len(store.index), 2)
+        store.append([BinaryFormat.encode("State.2", {"id": "2"})])
+        self.assertEqual(len(self.open().index), 3)
+
+    def test_not_binary(self):
+        """Test that a file in another format raises ValueError."""
+        with open(self.path, 'w') as f:
+            f.write("{}")
+        with self.assertRaises(ValueError):
+            RecordStore(self.path)
@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+"""
+Contains the TestSQLiteStorageDocs and TestSQLiteStorage classes
+"""
+
+import inspect
+import unittest
+import pep8
+import models
+from models.engine import sqlite_storage
+from models.city import City
+from models.state import State
+
+SQLiteStorage = sqlite_storage.SQLiteStorage
+
+
+class TestSQLiteStorageDocs(unittest.TestCase):
+    """Tests to check the documentation and style of SQLiteStorage class"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up for the doc tests"""
+        cls.sqls_f = inspect.getmembers(SQLiteStorage, inspect.isfunction)
+
+    def test_pep8_conformance_sqlite_storage(self):
+        """Test that models/engine/sqlite_storage.py conforms to PEP8."""
+        pep8s = pep8.StyleGuide(quiet=True)
+        result = pep8s.check_files(["models/engine/sqlite_storage.py",
+                                    "tests/test_models/test_engine/"
+                                    "test_sqlite_storage.py"])
+        self.assertEqual(
+            result.total_errors, 0, "Found code style errors (and warnings)."
+        )
+
+    def test_sqlite_storage_module_docstring(self):
+        """Test for the sqlite_storage.py module docstring"""
+        self.assertIsNot(sqlite_storage.__doc__, None,
+                         "sqlite_storage.py needs a docstring")
+        self.assertTrue(len(sqlite_storage.__doc__) >= 1,
+                        "sqlite_storage.py needs a docstring")
+
+    def test_sqlite_storage_class_docstring(self):
+        """Test for the SQLiteStorage class docstring"""
+        self.assertIsNot(SQLiteStorage.__doc__, None,
+                         "SQLiteStorage class needs a docstring")
+        self.assertTrue(len(SQLiteStorage.__doc__) >= 1,
+                        "SQLiteStorage class needs a docstring")
+
+    def test_sqls_func_docstrings(self):
+        """Test for the presence of docstrings in SQLiteStorage methods"""
+        for func in self.sqls_f:
+            self.assertIsNot(
+                func[1].__doc__, None,
+                "{} method needs a docstring".format(func[0])
+            )
+            self.assertTrue(
+                len(func[1].__doc__) >= 1,
+                "{} method needs a docstring".format(func[0])
+            )
+
+
+@unittest.skipUnless(isinstance(models.storage, SQLiteStorage),
+                     "testing SQLiteStorage")
+class TestSQLiteStorage(unittest.TestCase):
+    """Tests the SQLiteStorage."""
+
+    def setUp(self) -> None:
+        models.storage.drop_all_tables()
+
+    def execute(self, statement):
+        """returns the rows of a statement run on the database"""
+        engine = models.storage._DBStorage__engine
+        with engine.connect() as connection:
+            return connection.exec_driver_sql(statement).fetchall()
+
+    def test_wal_mode(self):
+        """Test that the database runs in WAL mode with foreign keys
+        checked."""
+        self.assertEqual(self.execute("PRAGMA journal_mode"), [("wal",)])
+        self.assertEqual(self.execute("PRAGMA foreign_keys"), [(1,)])
+
+    def test_foreign_keys_are_indexed(self):
+        """Test that the foreign key columns have an index."""
+        indexes = self.execute("PRAGMA index_list('cities')")
+        self.assertIn("ix_cities_state_id", [row[1] for row in indexes])
+
+    def test_save_reload(self):
+        """Test that committed objects are read back by a new session."""
+        state = State(name="Alaska")
+        state.save()
+        City(name="Juneau", state_id=state.id).save()
+        models.storage.close()
+        loaded = models.storage.get(State, state.id)
+        self.assertIsNot(loaded, state)
+        self.assertEqual([city.name for city in loaded.cities], ["Juneau"])
@@ -7,6 +7,7 @@ from flask import Flask, render_template
 
 from models import storage
 from models.amenity import Amenity
+from models.city import City
 from models.place import Place
 from models.state import State
 
@@ -24,18 +25,16 @@ def close_db(_):
 @app.route('/1-hbnb', strict_slashes=False)
 def hbnb():
     """ HBNB is alive! """
-    states = storage.all(State).values()
-    states = sorted(states, key=lambda k: k.name)
+    states = storage.query(State).order_by("name")
     st_ct = []
 
     for state in states:
-        st_ct.append([state, sorted(state.cities, key=lambda k: k.name)])
+        st_ct.append([state, storage.query(City).filter(
+            state_id=state.id).order_by("name").all()])
 
-    amenities = storage.all(Amenity).values()
-    amenities = sorted(amenities, key=lambda k: k.name)
+    amenities = storage.query(Amenity).order_by("name").all()
 
-    places = storage.all(Place).values()
-    places = sorted(places, key=lambda k: k.name)
+    places = storage.query(Place).order_by("name").all()
 
     return render_template('1-hbnb.html',
                            states=st_ct,
@@ -22,18 +22,16 @@ def close_db(error):
 @app.route('/3-hbnb/', strict_slashes=False)
 def hbnb():
     """ HBNB is alive! """
-    states = storage.all(State).values()
-    states = sorted(states, key=lambda k: k.name)
+    states = storage.query(State).order_by("name")
     st_ct = []
 
     for state in states:
-        st_ct.append([state, sorted(state.cities, key=lambda k: k.name)])
+        st_ct.append([state, storage.query(City).filter(
+            state_id=state.id).order_by("name").all()])
 
-    amenities = storage.all(Amenity).values()
-    amenities = sorted(amenities, key=lambda k: k.name)
+    amenities = storage.query(Amenity).order_by("name").all()
 
-    places = storage.all(Place).values()
-    places = sorted(places, key=lambda k: k.name)
+    places = storage.query(Place).order_by("name").all()
 
     return render_template('0-hbnb.html',
                            states=st_ct,
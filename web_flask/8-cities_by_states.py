@@ -12,8 +12,11 @@ app = Flask(__name__)
 @app.route('/cities_by_states', strict_slashes=False)
 def cities_by_states():
     """display the states and cities listed in alphabetical order"""
-    states = storage.all("State").values()
-    return render_template('8-cities_by_states.html', states=states)
+    states = storage.query("State").order_by("name").all()
+    cities = {state.id: storage.query("City").filter(
+        state_id=state.id).order_by("name").all() for state in states}
+    return render_template('8-cities_by_states.html', states=states,
+                           cities=cities)
 
 
 @app.teardown_appcontext
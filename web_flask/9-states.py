@@ -13,10 +13,16 @@ app = Flask(__name__)
 @app.route('/states/<state_id>', strict_slashes=False)
 def states(state_id=None):
     """display the states and cities listed in alphabetical order"""
-    states = storage.all("State")
-    if state_id is not None:
-        state_id = 'State.' + state_id
-    return render_template('9-states.html', states=states, state_id=state_id)
+    states = state = cities = None
+    if state_id is None:
+        states = storage.query("State").order_by("name").all()
+    else:
+        state = storage.query("State").filter(id=state_id).first()
+    if state is not None:
+        cities = storage.query("City").filter(
+            state_id=state.id).order_by("name").all()
+    return render_template('9-states.html', states=states, state_id=state_id,
+                           state=state, cities=cities)
 
 
 @app.teardown_appcontext